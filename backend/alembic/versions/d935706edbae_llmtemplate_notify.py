@@ -0,0 +1,51 @@
+"""llmtemplate notify
+
+Revision ID: d935706edbae
+Revises: 3f7a353a4d5e
+Create Date: 2026-10-18 19:47:10.117587
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd935706edbae'
+down_revision: Union[str, None] = '3f7a353a4d5e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # llmtemplate 变更时通过 pg_notify 通知所有 worker 刷新模板
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_llmtemplate_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify(
+                'llmtemplate',
+                json_build_object(
+                    'op', TG_OP,
+                    'id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END
+                )::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER llmtemplate_notify
+        AFTER INSERT OR UPDATE OR DELETE ON llmtemplate
+        FOR EACH ROW EXECUTE FUNCTION notify_llmtemplate_change();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS llmtemplate_notify ON llmtemplate;")
+    op.execute("DROP FUNCTION IF EXISTS notify_llmtemplate_change();")
@@ -0,0 +1,40 @@
+"""sysuser openid unique
+
+Revision ID: de881e315b4c
+Revises: 841147b86908
+Create Date: 2026-10-18 20:01:20.008006
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'de881e315b4c'
+down_revision: Union[str, None] = '841147b86908'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 并发首次登录可能已产生重复 openId, 保留最早的账号, 其余改名后保留数据
+    op.execute(
+        """
+        UPDATE sysuser SET "openId" = "openId" || '#dup' || id
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY "openId" ORDER BY id) AS rn
+                FROM sysuser
+            ) t
+            WHERE rn > 1
+        )
+        """
+    )
+    op.create_index(op.f('ix_sysuser_openId'), 'sysuser', ['openId'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_sysuser_openId'), table_name='sysuser')
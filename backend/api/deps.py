@@ -1,14 +1,17 @@
-from collections.abc import Generator
-from typing import Annotated
+from collections.abc import AsyncGenerator
+import hashlib
+import time
+from typing import Annotated, Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from core import security
-from core.db import engine
+from core.cache import token_cache, user_cache
+from core.db import async_engine
 from core.config import settings
 from model import SysUser, TokenPayload
 
@@ -17,29 +20,68 @@ reusable_oauth2 = OAuth2PasswordBearer(
 )
 
 
-def get_db() -> Generator[Session]:
-    with Session(engine) as session:
+async def get_db() -> AsyncGenerator[AsyncSession]:
+    # 提交后不过期对象, 避免在事件循环中隐式查询
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+SessionDep = Annotated[AsyncSession, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> SysUser:
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+    )
+
+
+def decode_token(token: str) -> tuple[str, int, Optional[float]]:
+    """校验 token, 返回 (openId, 用户ID, 过期时间戳), token 的 sub 为 openId#userId"""
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
         token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-        )
-    user = session.get(SysUser, token_data.sub.split("#")[1])
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+        openId, user_id = token_data.sub.split("#")
+        return openId, int(user_id), payload.get("exp")
+    except (
+        InvalidTokenError,
+        ValidationError,
+        AttributeError,
+        ValueError,
+    ):
+        raise credentials_exception()
+
+
+def get_token_user_id(token: str) -> int:
+    """校验 token 并取出用户ID, 校验结果按 token 摘要缓存到过期为止"""
+    key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(key)
+    now = time.time()
+    if cached is None:
+        cached = decode_token(token)
+        ttl = settings.TOKEN_CACHE_TTL
+        if cached[2] is not None:
+            ttl = min(cached[2] - now, ttl)
+        token_cache.set(key, cached, ttl)
+    elif cached[2] is not None and cached[2] <= now:
+        token_cache.pop(key)
+        raise credentials_exception()
+    return cached[1]
+
+
+async def get_current_user(session: SessionDep, token: TokenDep) -> SysUser:
+    user_id = get_token_user_id(token)
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await session.get(SysUser, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user_cache.set(user_id, SysUser.model_validate(user))
+        return user
+    # 缓存对象在请求之间共享, 只读, 不能修改或加入 session
     return user
 
 CurrentUser = Annotated[SysUser, Depends(get_current_user)]
@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from api.routes import monitor
 from api.routes.wechat_miniprogram import llm, wx
 from api.routes.bms import llmTemp
 
@@ -9,3 +10,6 @@ api_router.include_router(wx.router)
 
 # 后端管理接口
 api_router.include_router(llmTemp.router)
+
+# 监控接口
+api_router.include_router(monitor.router)
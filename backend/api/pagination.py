@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+
+def encode_cursor(createTime: datetime, id: int) -> str:
+    """按 (createTime, id) 生成翻页游标"""
+    raw = f"{createTime.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """解析翻页游标, 格式不对时返回 400"""
+    try:
+        createTime, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(createTime), int(id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的游标")
+
+
+def keyset_page(statement, createTime_col, id_col, cursor: Optional[str], limit: int):
+    """按 (createTime, id) 倒序取 cursor 之后的一页, 多取一条用于判断是否还有下一页"""
+    if cursor:
+        createTime, id = decode_cursor(cursor)
+        statement = statement.where(tuple_(createTime_col, id_col) < (createTime, id))
+    return statement.order_by(createTime_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def next_cursor(rows: list, limit: int) -> tuple[list, Optional[str]]:
+    """截掉多取的一条, 返回 (本页数据, 下一页游标)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].createTime, rows[-1].id)
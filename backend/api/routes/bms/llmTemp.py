@@ -1,58 +1,79 @@
+from typing import Optional
 from fastapi import APIRouter, Query
 from loguru import logger
 from sqlalchemy import func
-from sqlmodel import desc, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from api.pagination import keyset_page, next_cursor
 from api.type import ApiResponse, PageBody
 from api.routes.bms.deps import checkReferer
 from api.deps import SessionDep
 from api.routes.bms.type import llmTempBody
-from llm.main import setTemplates
+from core.cache import template_count_cache
+from llm.main import removeTemplate, upsertTemplate
 from model import LLMTemplate
 
 
 router = APIRouter(tags=["bms"], prefix="/bms/llm")
 
 
+async def count_templates(session: AsyncSession, type: Optional[str]) -> int:
+    """模板总数, 按 type 条件缓存"""
+    total = template_count_cache.get(type)
+    if total is None:
+        statement = select(func.count(LLMTemplate.id))
+        if type:
+            statement = statement.where(LLMTemplate.type == type)
+        total = (await session.exec(statement)).one()
+        template_count_cache.set(type, total)
+    return total
+
+
 @router.get("/temp/list", dependencies=[checkReferer], summary="获取模板列表分页")
-def getTempList(
+async def getTempList(
     session: SessionDep,
     pageSize: int = Query(10, ge=1, le=100, description="每一页条数"),
-    page: int = Query(1, ge=1, description="第几页"),
+    page: int = Query(1, ge=1, description="第几页, 传 cursor 时忽略"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor"),
+    type: Optional[str] = Query(None, description="按模板类型过滤"),
+    withTotal: bool = Query(True, description="是否返回总数"),
 ):
-    page = page - 1
-    # 构造查询
-    statement = select(func.count(LLMTemplate.id))
-    total_count = session.exec(statement).first()
-    statement = (
-        select(LLMTemplate)
-        .order_by(desc(LLMTemplate.createTime))
-        .offset(page)
-        .limit(pageSize)
+    statement = select(LLMTemplate)
+    if type:
+        statement = statement.where(LLMTemplate.type == type)
+    statement = keyset_page(
+        statement, LLMTemplate.createTime, LLMTemplate.id, cursor, pageSize
+    )
+    if not cursor:
+        statement = statement.offset((page - 1) * pageSize)
+    results, nextCursor = next_cursor((await session.exec(statement)).all(), pageSize)
+    total = await count_templates(session, type) if withTotal else None
+    return ApiResponse(
+        code=200, data=PageBody(total=total, list=results, nextCursor=nextCursor)
     )
-    results = session.exec(statement).all()
-    return ApiResponse(code=200, data=PageBody(total=total_count, list=results))
 
 
 @router.post("/temp/create", dependencies=[checkReferer], summary="添加模板")
-def addTemp(session: SessionDep, body: llmTempBody):
-    temp = LLMTemplate(template=body.template, type=body.type)
+async def addTemp(session: SessionDep, body: llmTempBody):
+    temp = LLMTemplate(
+        template=body.template, type=body.type, cacheable=bool(body.cacheable)
+    )
     session.add(temp)
-    session.commit()
-    session.refresh(temp)
-    # 更新模板
-    statement = select(LLMTemplate)
-    templates = session.exec(statement).all()
-    setTemplates(templates)
+    await session.commit()
+    await session.refresh(temp)
+    # 更新当前 worker 的模板, 其他 worker 通过 llmtemplate 通知刷新
+    upsertTemplate(temp)
+    template_count_cache.clear()
     return ApiResponse(code=200, data="")
 
 
 @router.put("/temp/update", dependencies=[checkReferer], summary="修改模板")
-def updateTemp(session: SessionDep, body: llmTempBody):
+async def updateTemp(session: SessionDep, body: llmTempBody):
     if not body.id:
         return ApiResponse(code=500, data="缺少ID")
     statement = select(LLMTemplate).where(LLMTemplate.id == body.id)
-    item = session.exec(statement).first()
+    item = (await session.exec(statement)).first()
 
     if not item:
         return ApiResponse(code=500, data="没有这条纪录去修改")
@@ -63,26 +84,27 @@ def updateTemp(session: SessionDep, body: llmTempBody):
     if body.type:
         item.type = body.type
 
+    if body.cacheable is not None:
+        item.cacheable = body.cacheable
+
     session.add(item)
-    session.commit()
-    session.refresh(item)
-    # 更新模板
-    statement = select(LLMTemplate)
-    templates = session.exec(statement).all()
-    setTemplates(templates)
+    await session.commit()
+    await session.refresh(item)
+    # 更新当前 worker 的模板, 其他 worker 通过 llmtemplate 通知刷新
+    upsertTemplate(item)
+    template_count_cache.clear()
     return ApiResponse(code=200, data="")
 
 
 @router.delete("/temp/delete", dependencies=[checkReferer], summary="根据ID删除")
-def deleteTemp(session: SessionDep, id=Query(description="模板ID")):
+async def deleteTemp(session: SessionDep, id=Query(description="模板ID")):
     statement = select(LLMTemplate).where(LLMTemplate.id == int(id))
-    item = session.exec(statement).first()
+    item = (await session.exec(statement)).first()
     if not item:
         return ApiResponse(code=500, data="没有这条纪录去删除")
-    session.delete(item)
-    session.commit()
-    # 更新模板
-    statement = select(LLMTemplate)
-    templates = session.exec(statement).all()
-    setTemplates(templates)
+    await session.delete(item)
+    await session.commit()
+    # 更新当前 worker 的模板, 其他 worker 通过 llmtemplate 通知刷新
+    removeTemplate(int(id))
+    template_count_cache.clear()
     return ApiResponse(code=200, data="")
@@ -6,3 +6,5 @@ class llmTempBody(BaseModel):
     id: Optional[int] = None
     type: str
     template: str
+    # 是否缓存生成结果, 不传时新增为 False, 修改时保持不变
+    cacheable: Optional[bool] = None
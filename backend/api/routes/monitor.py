@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from api.routes.bms.deps import checkReferer
+from api.type import ApiResponse
+from core.metrics import metrics
+
+router = APIRouter(tags=["monitor"], prefix="/monitor")
+
+
+@router.get("/metrics", dependencies=[checkReferer], summary="获取当前 worker 的运行指标")
+async def get_metrics() -> ApiResponse[dict]:
+    return ApiResponse(data=metrics.snapshot())
@@ -1,22 +1,90 @@
+from datetime import date
 from typing import Annotated
-from fastapi import Depends, HTTPException, status
-from api.deps import SessionDep, TokenDep, get_current_user
+from fastapi import Depends, HTTPException, Request, status
+from sqlmodel import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from api.deps import SessionDep, TokenDep, get_token_user_id
+from core.cache import user_cache
+from core.config import settings
+from core.db import async_engine
+from core.quota import effective_chances, quota_ledger
 from model import SysUser
+from utils.wx_client import WxClient
 
 
-def get_current_llm_user(session: SessionDep, token: TokenDep) -> SysUser:
-    user = get_current_user(session, token)
-    if not user.llm_avaiable:
+async def get_current_llm_user(session: SessionDep, token: TokenDep) -> SysUser:
+    return await charge_llm_quota(session, get_token_user_id(token))
+
+
+async def charge_llm_quota(session: AsyncSession, user_id: int) -> SysUser:
+    """扣减一次额度, 返回扣减后的用户, 没有额度时返回 402"""
+    if settings.QUOTA_LEDGER_ENABLED:
+        return await charge_from_ledger(session, user_id)
+    # 有剩余额度时原子扣减一次, 并发请求不会超额消费
+    # 跨天后的首次使用在同一条语句中先恢复每日额度
+    today = date.today()
+    chances = effective_chances(today)
+    statement = (
+        update(SysUser)
+        .where(SysUser.id == user_id, chances > 0)
+        .values(llm_avaiable=chances - 1, quotaDay=today)
+        .returning(SysUser)
+    )
+    user = (await session.exec(statement)).scalars().first()
+    if not user:
+        await session.rollback()
+        if not await session.get(SysUser, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="您没有可用的消费额度了",
+        )
+    # 提交前复制, 提交后对象可能过期, 访问属性会触发隐式查询
+    user = SysUser.model_validate(user)
+    await session.commit()
+    user_cache.set(user_id, user)
+    return user
+
+
+async def charge_from_ledger(session: AsyncSession, user_id: int) -> SysUser:
+    """从进程内额度账本扣减"""
+
+    async def load_user() -> SysUser:
+        user = await session.get(SysUser, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    user = await quota_ledger.charge(user_id, load_user)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail="您没有可用的消费额度了",
         )
-    # 如果存在就数量减一
-    user.llm_avaiable = user.llm_avaiable - 1
-    session.add(user)
-    session.commit()
-    session.refresh(user)
+    user_cache.set(user_id, SysUser.model_validate(user))
     return user
 
 
+async def refund_llm_quota(user_id: int) -> None:
+    """LLM 调用失败时退还本次扣减的额度"""
+    user_cache.pop(user_id)
+    if settings.QUOTA_LEDGER_ENABLED and quota_ledger.refund(user_id):
+        return
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            update(SysUser)
+            .where(SysUser.id == user_id)
+            .values(llm_avaiable=SysUser.llm_avaiable + 1)
+        )
+        await session.commit()
+
+
 CurrentLLMUser = Annotated[SysUser, Depends(get_current_llm_user)]
+
+
+def get_wx_client(request: Request) -> WxClient:
+    """lifespan 中创建的微信接口客户端"""
+    return request.app.state.wx_client
+
+
+WxClientDep = Annotated[WxClient, Depends(get_wx_client)]
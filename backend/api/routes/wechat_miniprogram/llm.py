@@ -1,34 +1,160 @@
+from contextlib import aclosing
+from datetime import date
 import json
-from fastapi import APIRouter, Body
+import time
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Body, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from loguru import logger
 from sqlalchemy import func
-from sqlmodel import desc, select
-from api.routes.wechat_miniprogram.deps import CurrentLLMUser, SessionDep
-from api.deps import CurrentUser
-from api.routes.wechat_miniprogram.type import LLMRequestBody, ShareReq
-from model import UserAction, UserCreateHistory
-from llm.main import create_chain, getTemplate
-from api.type import ApiResponse
+from sqlmodel import desc, select, update
+from api.routes.wechat_miniprogram.deps import (
+    SessionDep,
+    charge_llm_quota,
+    refund_llm_quota,
+)
+from api.deps import CurrentUser, TokenDep, get_current_user, get_token_user_id
+from api.routes.wechat_miniprogram.type import (
+    GenerateLogSummary,
+    LLMRequestBody,
+    ShareReq,
+)
+from api.pagination import keyset_page, next_cursor
+from api.sse import SSE_PING, coalesce, sse_event
+from core.cache import response_cache, user_cache
+from core.config import settings
+from core.metrics import metrics
+from core.quota import available_chances, effective_chances
+from core.write_queue import write_queue
+from model import SysUser, UserAction, UserCreateHistory
+from llm.main import getLLMTemplate, getTemplate, invoke, request_key, stream
+from api.type import ApiResponse, PageBody
 
 router = APIRouter(tags=["llm"], prefix="/llm")
 
 
 # 流式生成作文 (HTTP)
 @router.post("/streaming", summary="根据类型和参数流式生成")
-def streaming_endpoint(current_user: CurrentLLMUser, body: LLMRequestBody):
+async def streaming_endpoint(
+    session: SessionDep,
+    token: TokenDep,
+    body: LLMRequestBody,
+    sse: bool = Query(
+        False, description="以 SSE 格式返回, 合并细碎的片段, 结束时返回用量和耗时"
+    ),
+):
     template = getTemplate(body.type)
 
     if not template:
-        return ApiResponse(code=500, message="未获取相对应的模板")
+        return ApiResponse(code=500, message="未获取相对应的模板", data=None)
+    # 找到模板后再扣减额度, 类型不存在时不消耗次数
+    current_user = await charge_llm_quota(session, get_token_user_id(token))
+
+    start = time.monotonic()
+    contents = stream(template, body.params)
+    # 先取首个 token, 排队被拒绝或调用失败时还能返回对应的状态码
+    try:
+        first = await anext(contents, None)
+    except Exception:
+        await contents.aclose()
+        await refund_llm_quota(current_user.id)
+        raise
+
+    chunks: list[str] = []
+    usage: Optional[dict] = None
+    # 首个非空内容的耗时, 首个片段可能只有角色或用量
+    first_token: Optional[float] = None
 
-    chain = create_chain(template)
+    async def tokens() -> AsyncIterator[str]:
+        """逐个返回生成内容, 同时记录已生成的内容和用量"""
+        nonlocal usage, first_token
+        async with aclosing(contents):
+            chunk = first
+            while chunk is not None:
+                if chunk.usage_metadata:
+                    usage = chunk.usage_metadata
+                if chunk.content:
+                    if first_token is None:
+                        first_token = time.monotonic() - start
+                    chunks.append(chunk.content)
+                    yield chunk.content
+                chunk = await anext(contents, None)
+
+    def save_history():
+        # 正常结束或客户端中途断开都保存已生成的内容, 生成失败已退还额度不保存
+        if chunks:
+            write_queue.put_later(
+                UserCreateHistory(
+                    userId=current_user.id,
+                    username=current_user.username,
+                    content="".join(chunks),
+                    params=json.dumps(body.params, ensure_ascii=False),
+                )
+            )
 
     # 异步生成器
     async def generate():
-        async for chunk in chain.astream(body.params):
-            yield chunk.content  # 逐步返回生成内容
+        failed = False
+        try:
+            async with aclosing(tokens()) as texts:
+                async for content in texts:
+                    yield content  # 逐步返回生成内容
+        except Exception:
+            failed = True
+            await refund_llm_quota(current_user.id)
+            raise
+        finally:
+            if not failed:
+                save_history()
+
+    async def generate_sse():
+        failed = False
+        frames = 0
+        try:
+            async with aclosing(
+                coalesce(
+                    tokens(),
+                    settings.STREAM_FRAME_BYTES,
+                    settings.STREAM_FRAME_INTERVAL,
+                    settings.STREAM_HEARTBEAT_INTERVAL,
+                )
+            ) as texts:
+                async for text in texts:
+                    if text is None:
+                        yield SSE_PING
+                        continue
+                    frames += 1
+                    yield sse_event({"content": text})
+        except Exception as e:
+            failed = True
+            await refund_llm_quota(current_user.id)
+            logger.error(f"流式生成失败: {e!r}")
+            yield sse_event({"message": "生成失败, 已退还次数"}, "error")
+            return
+        finally:
+            metrics.inc("llm.stream.frames", frames)
+            if not failed:
+                save_history()
+        yield sse_event(
+            {
+                "usage": usage,
+                "chunks": len(chunks),
+                "frames": frames,
+                "firstTokenMs": (
+                    round(first_token * 1000) if first_token is not None else None
+                ),
+                "elapsedMs": round((time.monotonic() - start) * 1000),
+            },
+            "done",
+        )
 
+    if sse:
+        return StreamingResponse(
+            generate_sse(),
+            media_type="text/event-stream",
+            # 禁止代理缓冲, 否则合并后的帧仍会被攒到一起
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     return StreamingResponse(generate(), media_type="text/plain")
 
 
@@ -37,51 +163,115 @@ def streaming_endpoint(current_user: CurrentLLMUser, body: LLMRequestBody):
     "/generate", response_model=ApiResponse[str], summary="根据类型和参数直接生成"
 )
 async def generate_once(
-    session: SessionDep, current_user: CurrentLLMUser, body: LLMRequestBody
+    session: SessionDep, token: TokenDep, body: LLMRequestBody
 ) -> ApiResponse[str]:
-    template = getTemplate(body.type)
-    if not template:
+    temp = getLLMTemplate(body.type)
+    if not temp:
         return ApiResponse(code=500, message="未获取相对应的模板", data="")
 
-    chain = create_chain(template)
-    # 生成完整内容
-    result = await chain.ainvoke(body.params)
+    # 开启缓存的模板先查缓存, 按配置决定命中时是否扣减额度
+    key = request_key(temp.template, body.params) if temp.cacheable else None
+    content = response_cache.get(key) if key else None
+    if key:
+        metrics.inc("response_cache.hit" if content is not None else "response_cache.miss")
+    if content is not None and settings.RESPONSE_CACHE_SKIP_QUOTA:
+        current_user = await get_current_user(session, token)
+    else:
+        current_user = await charge_llm_quota(session, get_token_user_id(token))
+
+    if content is None:
+        # 生成完整内容
+        try:
+            content = await invoke(temp.template, body.params)
+        except Exception:
+            await refund_llm_quota(current_user.id)
+            raise
+        if key:
+            response_cache.set(key, content)
 
-    # 存储用户的生成纪录
-    log = UserCreateHistory(
-        userId=current_user.id,
-        username=current_user.username,
-        content=result.content,
-        params=json.dumps(body.params, ensure_ascii=False),
+    # 存储用户的生成纪录, 由写入队列批量写入
+    await write_queue.put(
+        UserCreateHistory(
+            userId=current_user.id,
+            username=current_user.username,
+            content=content,
+            params=json.dumps(body.params, ensure_ascii=False),
+        )
     )
-    session.add(log)
-    session.commit()
-    session.refresh(log)
-    return ApiResponse(code=200, data=result.content)
+    return ApiResponse(code=200, data=content)
 
 
 @router.get("/generate/logs", summary="获取生成的历史纪录")
-def get_generate_log(session: SessionDep, current_user: CurrentUser):
+async def get_generate_log(session: SessionDep, current_user: CurrentUser):
     statement = (
         select(UserCreateHistory)
         .where(UserCreateHistory.userId == current_user.id)
         .order_by(desc(UserCreateHistory.createTime))
         .limit(20)
     )
-    logs = session.exec(statement).all()
+    logs = (await session.exec(statement)).all()
 
     return ApiResponse(code=200, data=logs)
 
 
+# 摘要模式下 content 预览的字符数
+LOG_PREVIEW_LENGTH = 100
+
+
+@router.get("/generate/logs/page", summary="游标分页获取生成的历史纪录")
+async def get_generate_log_page(
+    session: SessionDep,
+    current_user: CurrentUser,
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor"),
+    limit: int = Query(20, ge=1, le=100, description="每一页条数"),
+    summary: bool = Query(False, description="只返回内容预览和参数"),
+):
+    if summary:
+        statement = select(
+            UserCreateHistory.id,
+            UserCreateHistory.params,
+            func.substr(UserCreateHistory.content, 1, LOG_PREVIEW_LENGTH).label(
+                "preview"
+            ),
+            UserCreateHistory.createTime,
+        )
+    else:
+        statement = select(UserCreateHistory)
+    statement = keyset_page(
+        statement.where(UserCreateHistory.userId == current_user.id),
+        UserCreateHistory.createTime,
+        UserCreateHistory.id,
+        cursor,
+        limit,
+    )
+    rows, nextCursor = next_cursor((await session.exec(statement)).all(), limit)
+    if summary:
+        rows = [GenerateLogSummary.model_validate(row._mapping) for row in rows]
+    return ApiResponse(code=200, data=PageBody(list=rows, nextCursor=nextCursor))
+
+
+@router.get(
+    "/generate/logs/{id}",
+    response_model=ApiResponse[UserCreateHistory],
+    summary="获取单条生成纪录的完整内容",
+)
+async def get_generate_log_detail(
+    session: SessionDep, current_user: CurrentUser, id: int
+):
+    log = await session.get(UserCreateHistory, id)
+    if not log or log.userId != current_user.id:
+        raise HTTPException(status_code=404, detail="纪录不存在")
+    return ApiResponse(code=200, data=log)
+
 # 获取llm服务可用次数
 @router.get("/llmAvailable", summary="获取可用的llm服务可用次数")
-def get_llm_available(current_user: CurrentUser) -> ApiResponse[int]:
-    return ApiResponse(data=current_user.llm_avaiable)
+async def get_llm_available(current_user: CurrentUser) -> ApiResponse[int]:
+    return ApiResponse(data=available_chances(current_user))
 
 
 # 增加llm服务可用次数
 @router.post("/llmAvailable", summary="增加LLM的可调用次数")
-def add_llm_available_num(
+async def add_llm_available_num(
     session: SessionDep,
     current_user: CurrentUser,
     body: ShareReq,
@@ -89,11 +279,13 @@ def add_llm_available_num(
     if body.type == "share":
         logger.info(f"当前用户:{current_user.id}, 分享者id: {body.userId}")
         # 查询当前用户下已经获取过分享次数的ID
-        count = session.exec(
-            select(func.count(UserAction.id)).where(
-                UserAction.userId == body.userId,
-                UserAction.type == "share",
-                UserAction.toUserId == current_user.id,
+        count = (
+            await session.exec(
+                select(func.count(UserAction.id)).where(
+                    UserAction.userId == body.userId,
+                    UserAction.type == "share",
+                    UserAction.toUserId == str(current_user.id),
+                )
             )
         ).first()
         isAdd = False
@@ -103,16 +295,17 @@ def add_llm_available_num(
             logger.info(
                 f"用户ID:{current_user.id},用户名：{current_user.username}点击了id:{body.userId},+1"
             )
-            if not current_user.llm_avaiable:
-                current_user.llm_avaiable = 1
-            else:
-                current_user.llm_avaiable = 1 + current_user.llm_avaiable
-            session.add(current_user)
+            # 跨天时先恢复每日额度再加一次
+            today = date.today()
+            await session.exec(
+                update(SysUser)
+                .where(SysUser.id == current_user.id)
+                .values(llm_avaiable=effective_chances(today) + 1, quotaDay=today)
+            )
             actioninfo = UserAction(
-                userId=body.userId, toUserId=current_user.id, type="share"
+                userId=body.userId, toUserId=str(current_user.id), type="share"
             )
             session.add(actioninfo)
-            session.commit()
-            session.refresh(current_user)
-            session.refresh(actioninfo)
+            await session.commit()
+            user_cache.pop(current_user.id)
     return ApiResponse(code=200, data=True)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 
@@ -9,4 +10,12 @@ class LLMRequestBody(BaseModel):
 
 class ShareReq(BaseModel):
     type: str
-    userId: int
\ No newline at end of file
+    userId: int
+
+
+class GenerateLogSummary(BaseModel):
+    id: int
+    params: Optional[str] = None
+    # content 的前若干个字符
+    preview: str
+    createTime: Optional[datetime] = None
@@ -1,11 +1,13 @@
+import httpx
 from fastapi import APIRouter, Body, HTTPException
 from loguru import logger
-import requests
-from sqlmodel import Session, select
-from api.routes.wechat_miniprogram.deps import SessionDep
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+from api.routes.wechat_miniprogram.deps import SessionDep, WxClientDep
 from api.type import ApiResponse
 from api.deps import CurrentUser
-from core.config import settings
+from core.quota import available_chances
 from core.security import create_access_token
 import uuid
 
@@ -14,44 +16,48 @@ from model import SysUser, UserAction
 router = APIRouter(tags=["wx"], prefix="/wx")
 
 
-def CreateUser(session: Session, openId):
+async def CreateUser(session: AsyncSession, openId) -> SysUser:
+    """按 openId 创建或获取用户, 一条语句完成, 并发首次登录不会重复建号"""
     user = SysUser(openId=openId, username=str(uuid.uuid4())[:10])
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    user2 = session.exec(select(SysUser).where(SysUser.openId == openId)).first()
-    return user2
+    statement = (
+        insert(SysUser)
+        .values(**user.model_dump(exclude={"id"}))
+        .on_conflict_do_update(
+            index_elements=[SysUser.openId], set_={"lastTime": func.now()}
+        )
+        .returning(SysUser)
+    )
+    user = (await session.exec(statement)).scalars().one()
+    await session.commit()
+    return user
 
 
 @router.post("/login", summary="微信code登录")
-def wxLogin(
+async def wxLogin(
     session: SessionDep,
+    wx_client: WxClientDep,
     code: str = Body(1, title="微信code", embed=True),
 ):
     logger.info(f"微信登录鉴权----start----code: {code}")
-    appId = settings.WX_APP_ID
-    appSecret = settings.WX_APP_SECRET
-    url = f"https://api.weixin.qq.com/sns/jscode2session?appid={appId}&secret={appSecret}&js_code={code}&grant_type=authorization_code"
-    response = requests.get(url)
-    data = response.json()
+    try:
+        data = await wx_client.code2session(code)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"微信登录鉴权----error----code: {code}, {e!r}")
+        raise HTTPException(status_code=502, detail="微信登录服务暂不可用")
     if "errcode" in data:
         raise HTTPException(status_code=400, detail=data["errmsg"])
     openId = data["openid"]
-    statement = select(SysUser).where(SysUser.openId == openId)
-    session_user = session.exec(statement).first()
-    if not session_user:
-        logger.info(f"微信登录鉴权----pendding----用户不存在 创建用户----code: {code}")
-        session_user = CreateUser(session, openId)
-    else:
-        logger.info(f"微信登录鉴权----pendding----用户存在----code: {code}")
+    session_user = await CreateUser(session, openId)
     logger.info(f"微信登录鉴权----end----code: {code}")
     token = create_access_token(f"{openId}#{session_user.id}")
     return ApiResponse(code=200, data=token)
 
 
 @router.get("getUserInfo", summary="获取微信用户信息")
-def wxUserInfo(
+async def wxUserInfo(
     current_user: CurrentUser,
 ) -> ApiResponse:
 
-    return ApiResponse(code=200, data=current_user.model_dump(exclude={"openId"}))
+    data = current_user.model_dump(exclude={"openId"})
+    data["llm_avaiable"] = available_chances(current_user)
+    return ApiResponse(code=200, data=data)
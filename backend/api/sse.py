@@ -0,0 +1,73 @@
+import asyncio
+import json
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+
+# 上游流结束的标记
+_END = object()
+
+
+def sse_event(data, event: Optional[str] = None) -> str:
+    """一个 SSE 事件, data 按 JSON 编码, 内容中的换行不会破坏帧格式"""
+    frame = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{frame}" if event else frame
+
+
+# 心跳, 以冒号开头的注释行客户端会忽略
+SSE_PING = ": ping\n\n"
+
+
+async def coalesce(
+    source: AsyncIterator[str], max_bytes: int, max_interval: float, heartbeat: float
+) -> AsyncIterator[Optional[str]]:
+    """把细碎的片段合并后返回, 攒够 max_bytes 字节或距首个片段 max_interval 秒时返回一次
+
+    超过 heartbeat 秒没有内容时返回 None, 由调用方发送心跳.
+    上游在独立的任务中读取, 等待超时不会打断上游的读取.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async with aclosing(source):
+                async for text in source:
+                    queue.put_nowait(text)
+        except Exception as e:
+            queue.put_nowait(e)
+        else:
+            queue.put_nowait(_END)
+
+    task = asyncio.create_task(pump())
+    loop = asyncio.get_running_loop()
+    buffer: list[str] = []
+    size = 0
+    deadline = 0.0
+    try:
+        while True:
+            timeout = deadline - loop.time() if buffer else heartbeat
+            try:
+                item = await asyncio.wait_for(queue.get(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                else:
+                    yield None
+                continue
+            if item is _END or isinstance(item, Exception):
+                if buffer:
+                    yield "".join(buffer)
+                if item is _END:
+                    return
+                raise item
+            if not buffer:
+                deadline = loop.time() + max_interval
+            buffer.append(item)
+            size += len(item.encode())
+            if size >= max_bytes:
+                yield "".join(buffer)
+                buffer, size = [], 0
+    finally:
+        # 客户端断开时停止读取上游, 并等待上游关闭
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -10,5 +10,8 @@ class ApiResponse(BaseModel, Generic[T]):
     data: Optional[T]
 
 class PageBody(BaseModel, Generic[T]):
-    total: int
+    # 游标翻页时可能不返回总数
+    total: Optional[int] = None
     list: List[T]
+    # 下一页游标, 没有下一页时为空
+    nextCursor: Optional[str] = None
@@ -0,0 +1,25 @@
+from typing import Optional
+from core.config import settings
+from model import SysUser
+from utils.cache import TTLCache
+
+# 已登录用户缓存 用户ID -> SysUser, 额度或资料写入时失效
+# 其他 worker 的写入无法通知到这里, 最多延迟 USER_CACHE_TTL 秒
+user_cache: TTLCache[int, SysUser] = TTLCache(
+    settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL
+)
+
+# 已校验的 token 缓存 token 摘要 -> (openId, 用户ID, 过期时间戳)
+token_cache: TTLCache[bytes, tuple[str, int, Optional[float]]] = TTLCache(
+    settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL
+)
+
+# 后台模板列表总数缓存 type 过滤条件 -> 总数, 模板变更时清空
+template_count_cache: TTLCache[Optional[str], int] = TTLCache(
+    100, settings.TEMPLATE_COUNT_CACHE_TTL
+)
+
+# 生成结果缓存 (模板, 模型, 参数) 摘要 -> 生成内容
+response_cache: TTLCache[str, str] = TTLCache(
+    settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL
+)
@@ -38,6 +38,32 @@ class Settings(BaseSettings):
     BASE_URL: str = "http://localhost:11434/v1/"
     MODEL: str = "qwen2:7b"
     API_KEY: str = "ollama"
+    # 多个模型服务, JSON 列表, 每项 {name, base_url, model, api_key, weight, max_concurrency}
+    # 未填写的字段使用上面的默认值, 列表为空时只使用 BASE_URL 一个服务
+    LLM_BACKENDS: list[dict] = []
+    # 路由策略 least_outstanding: 在途请求最少, ewma: 综合在途请求数和延迟
+    LLM_ROUTING: str = "least_outstanding"
+    # 连续失败 LLM_EJECT_FAILURES 次的服务摘除 LLM_EJECT_SECONDS 秒
+    LLM_EJECT_FAILURES: int = 3
+    LLM_EJECT_SECONDS: float = 30
+    # 收到首个 token 前失败时的重试次数, 优先换其他服务
+    LLM_RETRIES: int = 2
+    # 每个 worker 对单个服务的最大并发请求数, 0 表示不限制
+    # LLM_BACKENDS 中未填写 max_concurrency 时使用
+    LLM_MAX_CONCURRENCY: int = 16
+    # 所有服务都满载时的排队长度和最长等待秒数, 超出时返回 429 / 503
+    LLM_QUEUE_SIZE: int = 100
+    LLM_QUEUE_TIMEOUT: float = 10
+    # 所有服务共用的 HTTP 连接池, 配置变更重建服务时继续复用已建立的连接
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 100
+    # 空闲连接保留秒数, 应小于模型服务端的 keep-alive 超时
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 30
+    LLM_HTTP_CONNECT_TIMEOUT: float = 5
+    # 读取超时, 流式请求为相邻两个 token 的最长间隔
+    LLM_HTTP_TIMEOUT: float = 120
+    # 使用 HTTP/2 (需要安装 h2), 未安装时退回 HTTP/1.1
+    LLM_HTTP2: bool = False
 
     # uvicorn
     SEVER_HOST: str = "0.0.0.0"
@@ -62,10 +88,22 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # 连接池, 每个 worker 独立
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_PRE_PING: bool = True
+    # 连接最长存活秒数, -1 表示不回收
+    DB_POOL_RECYCLE: int = 1800
+    # 通过 PgBouncer (事务模式) 连接时开启, 禁用预编译语句
+    DB_PGBOUNCER_MODE: bool = False
 
     # 微信
     WX_APP_ID: str
     WX_APP_SECRET: str
+    WX_API_BASE: str = "https://api.weixin.qq.com"
+    WX_HTTP_TIMEOUT: float = 5
+    WX_HTTP_MAX_CONNECTIONS: int = 20
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -79,6 +117,59 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def POSTGRES_DSN(self) -> str:
+        """psycopg 原生连接串, 用于 LISTEN/NOTIFY"""
+        return str(self.SQLALCHEMY_DATABASE_URI).replace(
+            "postgresql+psycopg://", "postgresql://", 1
+        )
+
+    # 多 worker 之间通过 Postgres 通知同步模板变更
+    ENABLE_TEMPLATE_LISTENER: bool = True
+
+    # 已登录用户缓存, 0 表示不缓存
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 10
+
+    # 已校验 token 缓存, 0 表示不缓存, 不会超过 token 本身的过期时间
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: float = 300
+
+    # 后台模板列表总数缓存时间, 模板变更时也会失效
+    TEMPLATE_COUNT_CACHE_TTL: float = 60
+
+    # 生成结果缓存, 只对开启 cacheable 的模板生效, 0 表示不缓存
+    RESPONSE_CACHE_SIZE: int = 1000
+    RESPONSE_CACHE_TTL: float = 3600
+    # 命中缓存时不扣减额度, 开启后额度用完的用户仍可无限获取已缓存的结果, 默认关闭
+    RESPONSE_CACHE_SKIP_QUOTA: bool = False
+
+    # 相同模板和参数的并发请求只调用一次模型, 结果 (或流) 分发给所有请求
+    # 开启后不同用户会拿到相同的内容且各自扣减次数, 默认关闭
+    SINGLE_FLIGHT_ENABLED: bool = False
+
+    # 流式生成请求返回 token 用量 (stream_options.include_usage), 模型服务不支持时关闭
+    LLM_STREAM_USAGE: bool = True
+    # SSE 模式下攒够 STREAM_FRAME_BYTES 字节或距首个片段 STREAM_FRAME_INTERVAL 秒时发送一帧
+    STREAM_FRAME_BYTES: int = 32
+    STREAM_FRAME_INTERVAL: float = 0.05
+    # SSE 模式下超过该秒数没有内容时发送心跳注释, 避免连接被中间代理断开
+    STREAM_HEARTBEAT_INTERVAL: float = 15
+
+    # 每日可用次数, 跨天后首次使用时恢复
+    DAILY_LLM_CHANCES: int = 3
+
+    # 额度账本 开启后额度扣减先记在内存, 定时批量写回数据库
+    QUOTA_LEDGER_ENABLED: bool = False
+    QUOTA_LEDGER_FLUSH_INTERVAL: float = 2
+
+    # 批量写入队列 攒够 BATCH_SIZE 条或每隔 FLUSH_INTERVAL 秒写入一次, 队列满时写入方等待
+    WRITE_QUEUE_MAX_SIZE: int = 10000
+    WRITE_QUEUE_BATCH_SIZE: int = 500
+    WRITE_QUEUE_FLUSH_INTERVAL: float = 0.2
+    WRITE_QUEUE_DRAIN_TIMEOUT: float = 10
+
     # NACOS
     NACOS_ENDPOINT: str = "192.168.2.197:8848"
     NACOS_NAMESPACE_ID: str = ""
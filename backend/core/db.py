@@ -1,5 +1,79 @@
+import time
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import create_engine
 from core.config import settings
+from core.metrics import metrics
 
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+class _PoolWaitMetrics:
+    """记录从连接池获取连接的等待时间和超时次数, 指标名取 pool_logging_name"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            metrics.inc(f"{self.logging_name}.pool.timeout")
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.observe(f"{self.logging_name}.pool.wait", elapsed)
+
+
+class InstrumentedQueuePool(_PoolWaitMetrics, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolWaitMetrics, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options() -> dict:
+    """连接池配置, 每个 worker 各有一个连接池, 总连接数 = worker 数 * (size + overflow)"""
+    options = dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if settings.DB_PGBOUNCER_MODE:
+        # PgBouncer 事务模式下不能使用服务端预编译语句
+        options["connect_args"] = {"prepare_threshold": None}
+    return options
+
+
+def register_pool_metrics(name: str, db_engine: Engine) -> None:
+    """注册连接池占用情况和签出次数指标"""
+    metrics.gauge(f"{name}.pool.size", lambda: db_engine.pool.size())
+    metrics.gauge(f"{name}.pool.checked_out", lambda: db_engine.pool.checkedout())
+    metrics.gauge(f"{name}.pool.checked_in", lambda: db_engine.pool.checkedin())
+    metrics.gauge(f"{name}.pool.overflow", lambda: db_engine.pool.overflow())
+
+    @event.listens_for(db_engine, "checkout")
+    def on_checkout(*args):
+        metrics.inc(f"{name}.pool.checkout")
+
+    @event.listens_for(db_engine, "connect")
+    def on_connect(*args):
+        metrics.inc(f"{name}.pool.connect")
+
+
+# 同步引擎, 供 alembic / 启动检查 / 脚本使用
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedQueuePool,
+    pool_logging_name="db_sync",
+    **engine_options(),
+)
+# 异步引擎 (psycopg async), 供接口使用
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_logging_name="db",
+    **engine_options(),
+)
+register_pool_metrics("db", async_engine.sync_engine)
@@ -0,0 +1,56 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    total: float = 0
+    max: float = 0
+
+
+class Metrics:
+    """进程内指标: 计数器, 仪表盘 (取值函数) 和耗时统计"""
+
+    def __init__(self):
+        self.counters: dict[str, float] = {}
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.timings: dict[str, Timing] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """计数器累加"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        """注册仪表盘, 读取指标时调用 func 取当前值"""
+        self.gauges[name] = func
+
+    def observe(self, name: str, seconds: float) -> None:
+        """记录一次耗时"""
+        with self.lock:
+            timing = self.timings.setdefault(name, Timing())
+            timing.count += 1
+            timing.total += seconds
+            timing.max = max(timing.max, seconds)
+
+    def snapshot(self) -> dict:
+        """当前所有指标"""
+        with self.lock:
+            counters = dict(self.counters)
+            timings = {
+                name: {
+                    "count": timing.count,
+                    "avg_ms": round(timing.total / timing.count * 1000, 3),
+                    "max_ms": round(timing.max * 1000, 3),
+                }
+                for name, timing in self.timings.items()
+                if timing.count
+            }
+        gauges = {name: func() for name, func in self.gauges.items()}
+        return {"counters": counters, "gauges": gauges, "timings": timings}
+
+
+metrics = Metrics()
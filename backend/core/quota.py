@@ -0,0 +1,210 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import date
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+from sqlalchemy import Integer, case, column, func, or_, values
+from sqlmodel import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.cache import user_cache
+from core.config import settings
+from core.db import async_engine
+from model import SysUser
+
+
+def effective_chances(day: date):
+    """day 当天的可用次数 SQL 表达式, quotaDay 早于 day 时按已恢复每日额度计算"""
+    current = func.coalesce(SysUser.llm_avaiable, 0)
+    stale = or_(SysUser.quotaDay.is_(None), SysUser.quotaDay < day)
+    return case(
+        (stale, func.greatest(current, settings.DAILY_LLM_CHANCES)), else_=current
+    )
+
+
+def available_chances(user: SysUser, day: Optional[date] = None) -> int:
+    """用户当天的可用次数, 与 effective_chances 规则一致"""
+    day = day or date.today()
+    current = user.llm_avaiable or 0
+    if user.quotaDay is None or user.quotaDay < day:
+        return max(current, settings.DAILY_LLM_CHANCES)
+    return current
+
+
+@dataclass
+class QuotaEntry:
+    user: SysUser
+    # 本地可用余额, 已扣除尚未写回的次数
+    balance: int
+    # 尚未写回数据库的扣减次数, 退还时可能为负
+    pending: int = 0
+
+
+class QuotaLedger:
+    """进程内额度账本
+
+    扣减只修改内存, 由后台任务每隔 flush_interval 秒用一条 UPDATE 批量写回 sysuser,
+    写回时以数据库返回的余额校正本地余额. 只在事件循环中访问, 不需要加锁.
+
+    - 多 worker 时各自维护账本, 同一用户在一个写回周期内最多可能多用 (worker 数 - 1) 倍额度
+    - 进程被强制杀掉时会丢失最近一个周期未写回的扣减 (用户少扣, 不会多扣), 正常退出时会写回
+    - 日期变化时先按原日期写回再清空账本, 前一天的扣减不会影响新一天的额度,
+      写回失败的扣减按原日期保留, 之后的周期重试
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.entries: dict[int, QuotaEntry] = {}
+        # 清空账本时写回失败的扣减 日期 -> 用户 ID -> 次数
+        self.failed: dict[date, dict[int, int]] = {}
+        self.day = date.today()
+        self.task: Optional[asyncio.Task] = None
+
+    async def charge(
+        self, user_id: int, load_user: Callable[[], Awaitable[SysUser]]
+    ) -> Optional[SysUser]:
+        """扣减一次额度, 余额不足返回 None"""
+        if date.today() != self.day:
+            try:
+                await self.flush(clear=True)
+            except Exception as e:
+                # 前一天的扣减已按原日期保留, 不影响当前请求
+                logger.error(f"额度账本跨天写回失败: {e}")
+        entry = self.entries.get(user_id)
+        if entry is None:
+            user = await load_user()
+            # 加载期间可能已有其他请求建立了账目
+            entry = self.entries.setdefault(
+                user_id,
+                QuotaEntry(
+                    user=SysUser.model_validate(user),
+                    balance=available_chances(user, self.day),
+                ),
+            )
+        if entry.balance <= 0:
+            return None
+        entry.balance -= 1
+        entry.pending += 1
+        return SysUser.model_validate(
+            entry.user,
+            update={"llm_avaiable": entry.balance, "quotaDay": self.day},
+        )
+
+    def refund(self, user_id: int) -> bool:
+        """退还一次额度, 用户不在账本中返回 False"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return False
+        entry.balance += 1
+        entry.pending -= 1
+        return True
+
+    async def flush(self, clear: bool = False) -> int:
+        """把待写回的扣减批量写入数据库, 返回写回的用户数"""
+        day = self.day
+        pending = {
+            user_id: entry.pending
+            for user_id, entry in self.entries.items()
+            if entry.pending
+        }
+        for user_id in pending:
+            self.entries[user_id].pending = 0
+        # 本周期没有扣减的账目可能已过期 (分享奖励, 其他 worker 扣减), 直接丢弃
+        self.entries = {
+            user_id: entry
+            for user_id, entry in self.entries.items()
+            if user_id in pending and not clear
+        }
+        if clear:
+            self.day = date.today()
+        if not pending:
+            await self._flush_failed()
+            return 0
+
+        try:
+            rows = await self._write(day, pending)
+        except Exception:
+            if clear:
+                # 账本已清空, 按原日期保留, 下个周期重试
+                failed = self.failed.setdefault(day, {})
+                for user_id, n in pending.items():
+                    failed[user_id] = failed.get(user_id, 0) + n
+            else:
+                # 写回失败时放回账本, 下个周期重试
+                for user_id, n in pending.items():
+                    entry = self.entries.get(user_id)
+                    if entry:
+                        entry.pending += n
+            raise
+
+        for user_id, llm_avaiable in rows:
+            entry = self.entries.get(user_id)
+            if entry:
+                # 以数据库为准, 再减去写回期间新产生的扣减
+                entry.balance = llm_avaiable - entry.pending
+        await self._flush_failed()
+        return len(pending)
+
+    async def _flush_failed(self) -> None:
+        """重试之前跨天时写回失败的扣减"""
+        for day, pending in list(self.failed.items()):
+            await self._write(day, pending)
+            del self.failed[day]
+            logger.info(f"额度账本补写 {day} 的扣减 {len(pending)} 个用户")
+
+    async def _write(self, day: date, pending: dict[int, int]) -> list:
+        """按 day 当天的额度写回扣减, 返回 (用户 ID, 写回后的余额)"""
+        counts = values(
+            column("id", Integer), column("n", Integer), name="counts"
+        ).data(list(pending.items()))
+        # 扣减属于 day 当天, quotaDay 已是之后日期的用户额度已恢复, 不再扣减
+        statement = (
+            update(SysUser)
+            .where(
+                SysUser.id == counts.c.id,
+                or_(SysUser.quotaDay.is_(None), SysUser.quotaDay <= day),
+            )
+            .values(
+                llm_avaiable=func.greatest(effective_chances(day) - counts.c.n, 0),
+                quotaDay=day,
+            )
+            .returning(SysUser.id, SysUser.llm_avaiable)
+            .execution_options(synchronize_session=False)
+        )
+        async with AsyncSession(async_engine) as session:
+            rows = (await session.exec(statement)).all()
+            await session.commit()
+        for user_id, _ in rows:
+            user_cache.pop(user_id)
+        return rows
+
+    def start(self) -> None:
+        """启动定时写回任务"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+            logger.info(f"额度账本已启用, 写回间隔 {self.flush_interval} 秒")
+
+    async def stop(self) -> None:
+        """停止定时写回并写回剩余扣减"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush(clear=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                count = await self.flush()
+                if count:
+                    logger.debug(f"额度账本写回 {count} 个用户")
+            except Exception as e:
+                logger.error(f"额度账本写回失败: {e}")
+
+
+quota_ledger = QuotaLedger(settings.QUOTA_LEDGER_FLUSH_INTERVAL)
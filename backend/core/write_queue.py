@@ -0,0 +1,151 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Optional
+
+from loguru import logger
+from sqlmodel import SQLModel, insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.config import settings
+from core.db import async_engine
+from core.metrics import metrics
+
+
+class WriteQueue:
+    """进程内批量写入队列
+
+    只追加, 不需要回读的记录 (生成纪录, 日志等) 放入队列, 后台任务每隔 flush_interval 秒
+    或攒够 batch_size 条时按表合并成多行 INSERT 写入.
+
+    - 队列满时 put 会等待, 把写入压力反馈给请求方
+    - 整批写入失败重试 max_retries 次后拆分写入, 只丢弃写不进去的记录并记日志
+    - 正常退出时在 drain_timeout 秒内写完队列中的记录, 进程被强制杀掉会丢失未写入的记录
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        drain_timeout: float,
+        max_retries: int = 3,
+    ):
+        self.queue: asyncio.Queue[SQLModel] = asyncio.Queue(max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drain_timeout = drain_timeout
+        self.max_retries = max_retries
+        self.task: Optional[asyncio.Task] = None
+        # put_later 产生的入队任务, 持有引用避免被回收
+        self.pending: set[asyncio.Task] = set()
+        metrics.gauge("write_queue.depth", self.queue.qsize)
+
+    async def put(self, item: SQLModel) -> None:
+        """放入一条待写入记录, 队列满时等待"""
+        if self.queue.full():
+            metrics.inc("write_queue.full")
+        await self.queue.put(item)
+
+    def put_later(self, item: SQLModel) -> None:
+        """在后台放入记录, 用于不能等待的场景 (如请求被取消时)"""
+        task = asyncio.create_task(self.put(item))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    def start(self) -> None:
+        """启动后台写入任务"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+            logger.info(
+                f"写入队列已启动, 批量 {self.batch_size} 条, 间隔 {self.flush_interval} 秒"
+            )
+
+    async def stop(self) -> None:
+        """写完队列中的记录后停止"""
+        if self.task is None:
+            return
+        try:
+            if self.pending:
+                await asyncio.gather(*self.pending, return_exceptions=True)
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"写入队列退出超时, 丢弃 {self.queue.qsize()} 条记录")
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _flush(self, batch: list[SQLModel]) -> None:
+        """整批写入, 重试仍失败时拆分后分别写入"""
+        for attempt in range(1, self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                await self._insert(batch)
+            except Exception as e:
+                logger.warning(f"写入队列第 {attempt} 次写入 {len(batch)} 条失败: {e}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(attempt)
+                continue
+            metrics.observe("write_queue.flush", time.perf_counter() - start)
+            metrics.inc("write_queue.rows", len(batch))
+            return
+        # 可能只是个别记录有问题, 拆分写入, 只丢弃写不进去的记录
+        await self._split(batch)
+
+    async def _split(self, batch: list[SQLModel]) -> None:
+        """对半拆分后各写一次, 失败的一半继续拆分, 直到单条记录"""
+        if len(batch) == 1:
+            metrics.inc("write_queue.dropped")
+            logger.error(f"写入队列丢弃记录: {batch[0]!r}")
+            return
+        mid = len(batch) // 2
+        for part in (batch[:mid], batch[mid:]):
+            try:
+                await self._insert(part)
+            except Exception:
+                await self._split(part)
+                continue
+            metrics.inc("write_queue.rows", len(part))
+
+    async def _insert(self, batch: list[SQLModel]) -> None:
+        """按表分组, 每张表一条多行 INSERT, 同一事务提交"""
+        groups: dict[type[SQLModel], list[dict]] = defaultdict(list)
+        for item in batch:
+            groups[type(item)].append(item.model_dump(exclude={"id"}))
+        async with AsyncSession(async_engine) as session:
+            for model, rows in groups.items():
+                await session.exec(insert(model).values(rows))
+            await session.commit()
+
+
+write_queue = WriteQueue(
+    settings.WRITE_QUEUE_MAX_SIZE,
+    settings.WRITE_QUEUE_BATCH_SIZE,
+    settings.WRITE_QUEUE_FLUSH_INTERVAL,
+    settings.WRITE_QUEUE_DRAIN_TIMEOUT,
+)
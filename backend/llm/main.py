@@ -1,23 +1,97 @@
+import hashlib
+import json
 import re
+from datetime import datetime
+from types import MappingProxyType
+import httpx
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessageChunk
 from loguru import logger
 import yaml
 from core.config import settings
-from typing import Sequence
+from typing import AsyncIterator, Mapping, Optional, Sequence
+from llm.router import Backend, LLMRouter
+from llm.singleflight import SingleFlight
 from model import LLMTemplate
 
-# 初始化 LangChain 的 ChatOpenAI 模型
-logger.info(
-    f"配置信息 当前使用的LLM模型为  MODEL={settings.MODEL}  BASE_URL={settings.BASE_URL} API_KEY={settings.API_KEY}"
-)
-chat_llm = ChatOpenAI(
-    model=settings.MODEL,
-    base_url=settings.BASE_URL,
-    api_key=settings.API_KEY,
+
+# 所有后端共用的 HTTP 客户端, 在 lifespan 中创建
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.LLM_HTTP_TIMEOUT, connect=settings.LLM_HTTP_CONNECT_TIMEOUT
+    )
+
+
+def create_http_client() -> httpx.AsyncClient:
+    http2 = settings.LLM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("未安装 h2, LLM 接口使用 HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=http_timeout(),
+        limits=httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def backends_from_settings() -> list[Backend]:
+    """LLM_BACKENDS 为空时只使用 BASE_URL/MODEL/API_KEY 一个后端"""
+    items = settings.LLM_BACKENDS or [{"name": "default"}]
+    return [
+        Backend(
+            name=item.get("name", f"backend{i}"),
+            base_url=item.get("base_url", settings.BASE_URL),
+            model=item.get("model", settings.MODEL),
+            api_key=item.get("api_key", settings.API_KEY),
+            weight=item.get("weight", 1),
+            max_concurrency=item.get(
+                "max_concurrency", settings.LLM_MAX_CONCURRENCY
+            ),
+            http_client=http_client,
+            timeout=http_timeout(),
+            stream_usage=settings.LLM_STREAM_USAGE,
+        )
+        for i, item in enumerate(items)
+    ]
+
+
+# 初始化 LLM 路由
+llm_router = LLMRouter(
+    settings.LLM_ROUTING,
+    settings.LLM_EJECT_FAILURES,
+    settings.LLM_EJECT_SECONDS,
+    settings.LLM_RETRIES,
+    settings.LLM_QUEUE_SIZE,
+    settings.LLM_QUEUE_TIMEOUT,
 )
 
 
+def start_llm() -> None:
+    """创建共用的 HTTP 客户端和后端, 在 lifespan 中调用"""
+    global http_client
+    http_client = create_http_client()
+    llm_router.set_backends(backends_from_settings())
+
+
+async def stop_llm() -> None:
+    """关闭所有后端和共用的 HTTP 客户端"""
+    global http_client
+    await llm_router.close()
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
 def parseTemplateParams(template: str):
     # 使用正则表达式提取花括号中的内容
     result = re.findall(r"\{(.*?)\}", template)
@@ -27,33 +101,118 @@ def parseTemplateParams(template: str):
         return []
 
 
-# """"""
-def create_chain(_template: str):
-    input_variables = (parseTemplateParams(_template),)
-    print(input_variables)
+def create_prompt(_template: str) -> PromptTemplate:
+    input_variables = parseTemplateParams(_template)
     template = PromptTemplate(input_variables=input_variables, template=_template)
-    chain = template | chat_llm
-    logger.info(
-        f"当前使用的LLM模型为  MODEL={settings.MODEL}  BASE_URL={settings.BASE_URL} prompt: {template}"
+    logger.info(f"编译模板 prompt: {template}")
+    return template
+
+
+# 已编译的 prompt 缓存 模板内容 -> prompt, 模板变更时失效
+prompts: dict[str, PromptTemplate] = {}
+
+
+def get_prompt(_template: str) -> PromptTemplate:
+    """获取模板对应的 prompt, 同一模板只编译一次"""
+    prompt = prompts.get(_template)
+    if prompt is None:
+        prompt = create_prompt(_template)
+        prompts[_template] = prompt
+    return prompt
+
+
+def _normalize_params(value):
+    """去掉字符串参数首尾空白, 让只差空白的请求命中同一个缓存"""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {key: _normalize_params(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize_params(item) for item in value]
+    return value
+
+
+def request_key(_template: str, params) -> str:
+    """相同请求的 key, 用于结果缓存和合并并发调用, 模板内容或模型变化后自然失效"""
+    raw = json.dumps(
+        [_template, llm_router.models, _normalize_params(params)],
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
     )
-    return chain
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# 合并相同模板和参数的并发调用
+flights = SingleFlight()
+
+
+async def invoke(_template: str, params) -> str:
+    """一次性生成, 相同请求并发时只调用一次模型"""
+
+    async def call() -> str:
+        prompt = await get_prompt(_template).ainvoke(params)
+        result = await llm_router.invoke(prompt)
+        return result.content
+
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await call()
+    return await flights.call(request_key(_template, params), call)
+
+
+def stream(_template: str, params) -> AsyncIterator[AIMessageChunk]:
+    """流式生成, 相同请求并发时共用一个上游流, 开启 LLM_STREAM_USAGE 时最后一个片段带有用量"""
+
+    async def source() -> AsyncIterator[AIMessageChunk]:
+        prompt = await get_prompt(_template).ainvoke(params)
+        async for chunk in llm_router.stream(prompt):
+            yield chunk
+
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return source()
+    return flights.stream(request_key(_template, params), source)
 
 
 templates: Sequence[LLMTemplate] = []
+# 模板索引 type -> 模板, 只读
+template_index: Mapping[str, LLMTemplate] = MappingProxyType({})
 
 
+def _template_order(temp: LLMTemplate):
+    return (temp.createTime or datetime.min, temp.id or 0)
+
+
+# 模板只在事件循环中修改 (BMS 接口, 变更通知和重连后的全量加载), 每次整体替换, 不需要加锁
 def setTemplates(_templates: Sequence[LLMTemplate]):
-    global templates
+    global templates, template_index, prompts
     templates = _templates
+    # type 重复时以最新创建的模板为准 (createTime 相同再比较 id)
+    index: dict[str, LLMTemplate] = {}
+    for temp in sorted(_templates, key=_template_order):
+        index[temp.type] = temp
+    template_index = MappingProxyType(index)
+    # 只保留仍在使用的模板对应的 prompt
+    current = {temp.template for temp in index.values()}
+    prompts = {key: prompt for key, prompt in prompts.items() if key in current}
+
+
+def upsertTemplate(_template: LLMTemplate):
+    """新增或替换单个模板"""
+    setTemplates([temp for temp in templates if temp.id != _template.id] + [_template])
+
+
+def removeTemplate(id: int):
+    """按 ID 移除单个模板"""
+    setTemplates([temp for temp in templates if temp.id != id])
 
 
 def getTemplate(type: str) -> str:
-    global templates
-    template: str = ""
-    for temp in list(templates):
-        if temp.type == type:
-            template = temp.template
-    return template
+    temp = template_index.get(type)
+    return temp.template if temp else ""
+
+
+def getLLMTemplate(type: str) -> Optional[LLMTemplate]:
+    return template_index.get(type)
 
 
 def load_config(content):
@@ -67,15 +226,16 @@ def load_config(content):
     settings.API_KEY = (
         settings.API_KEY if not "API_KEY" in yaml_config else yaml_config["API_KEY"]
     )
+    settings.LLM_BACKENDS = (
+        settings.LLM_BACKENDS
+        if not "BACKENDS" in yaml_config
+        else yaml_config["BACKENDS"]
+    )
     logger.info(
         f"配置信息 当前使用的LLM模型为  MODEL={settings.MODEL}  BASE_URL={settings.BASE_URL}"
     )
-    global chat_llm
-    chat_llm = ChatOpenAI(
-        model=settings.MODEL,
-        base_url=settings.BASE_URL,
-        api_key=settings.API_KEY,
-    )
+    # 模型变更 新请求使用新的后端, 在途请求继续使用原来的, 结束后关闭旧后端的连接
+    llm_router.set_backends(backends_from_settings())
 
 
 def on_config_change(args):
@@ -0,0 +1,341 @@
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Optional
+
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.prompt_values import PromptValue
+from langchain_openai import ChatOpenAI
+from loguru import logger
+import openai
+
+from core.metrics import metrics
+
+# 延迟 EWMA 的平滑系数, 越大越偏向最近的请求
+EWMA_ALPHA = 0.3
+
+
+def retryable(e: Exception) -> bool:
+    """连接失败, 超时, 限流和 5xx 可以换后端重试, 参数错误等直接返回"""
+    if isinstance(e, openai.APIConnectionError):
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return False
+
+
+class LLMOverloaded(Exception):
+    """排队已满 (429) 或排队超时 (503), retry_after 为建议的重试间隔秒数"""
+
+    def __init__(self, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.message = message
+
+
+class Backend:
+    """一个 OpenAI 兼容的模型服务"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        model: str,
+        api_key: str,
+        weight: float = 1,
+        max_concurrency: int = 0,
+        http_client: Optional[httpx.AsyncClient] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        stream_usage: bool = False,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.weight = weight
+        # 最大并发请求数, 0 表示不限制
+        self.max_concurrency = max_concurrency
+        # 重试由路由负责, 可以换到其他后端
+        self.llm = ChatOpenAI(
+            model=model,
+            base_url=base_url,
+            api_key=api_key,
+            max_retries=0,
+            timeout=timeout,
+            http_async_client=http_client,
+            # 流式请求的最后一个片段带上 token 用量
+            stream_usage=stream_usage,
+        )
+        # 共用的连接池由创建方关闭
+        self.shared_client = http_client is not None
+        # 在途请求数
+        self.outstanding = 0
+        # 延迟 EWMA (秒), 流式请求取首个 token 的时间
+        self.ewma = 0.0
+        # 连续失败次数, 达到阈值后摘除
+        self.failures = 0
+        self.ejected_until = 0.0
+        # 配置版本, 由路由在替换后端列表时设置
+        self.version = 0
+
+    def available(self) -> bool:
+        return not self.max_concurrency or self.outstanding < self.max_concurrency
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    async def aclose(self) -> None:
+        """关闭底层 HTTP 连接池, 共用的连接池除外"""
+        if not self.shared_client:
+            await self.llm.root_async_client.close()
+        self.llm.root_client.close()
+
+    def __repr__(self) -> str:
+        return f"Backend({self.name}, {self.model}@{self.base_url})"
+
+
+class LLMRouter:
+    """在多个模型服务之间分发请求
+
+    - least_outstanding: 选择 在途请求数 / 权重 最小的后端
+    - ewma: 选择 (在途请求数 + 1) x 延迟 EWMA / 权重 最小的后端
+    - 连续失败 eject_failures 次的后端摘除 eject_seconds 秒, 到期后重新参与选择
+    - 在收到首个 token 之前因连接, 超时, 限流或 5xx 失败时, 优先换一个后端重试, 最多 retries 次
+    - 后端的并发名额 (max_concurrency) 都已占满时按先来后到排队, 队列满或等待超过
+      queue_timeout 秒时直接拒绝, 避免所有请求一起变慢直到超时
+    - 配置变更替换后端列表时, 旧后端不再接收新请求, 在途请求 (outstanding) 全部结束后
+      关闭其连接池 (共用的连接池除外)
+    """
+
+    def __init__(
+        self,
+        strategy: str = "least_outstanding",
+        eject_failures: int = 3,
+        eject_seconds: float = 30,
+        retries: int = 1,
+        queue_size: int = 100,
+        queue_timeout: float = 10,
+    ):
+        self.strategy = strategy
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self.retries = retries
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.backends: list[Backend] = []
+        # 排队中的请求 (等待分配后端的 future, 优先避开的后端)
+        self.waiters: deque[tuple[asyncio.Future, set[Backend]]] = deque()
+        # 配置版本, 每次替换后端列表加一
+        self.version = 0
+        # 已被替换, 等待在途请求结束后关闭的后端
+        self.retired: list[Backend] = []
+        # 关闭连接池的任务, 持有引用避免被回收
+        self.closing: set[asyncio.Task] = set()
+        # 所在的事件循环, 在其他线程替换后端时用于安排关闭旧后端
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        metrics.gauge("llm.queue.depth", lambda: len(self.waiters))
+        metrics.gauge("llm.retired", lambda: len(self.retired))
+
+    def set_backends(self, backends: list[Backend]) -> None:
+        """替换后端列表, 在途请求继续使用原来的后端
+
+        可能在 Nacos 的回调线程中调用, 这里只替换列表, 旧后端的关闭在事件循环中进行
+        """
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        self.version += 1
+        for backend in backends:
+            backend.version = self.version
+        retired = self.backends
+        self.backends = backends
+        self.retired.extend(retired)
+        # 没有后续请求时也要关闭已空闲的旧后端
+        if retired and self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._reap)
+        for backend in backends:
+            name = backend.name
+            metrics.gauge(
+                f"llm.{name}.outstanding",
+                lambda name=name: self._stat(name, "outstanding"),
+            )
+            metrics.gauge(
+                f"llm.{name}.ewma_ms", lambda name=name: self._stat(name, "ewma") * 1000
+            )
+        logger.info(
+            f"LLM 后端 v{self.version}: {backends}, 路由策略 {self.strategy}"
+        )
+
+    def _reap(self) -> None:
+        """关闭已被替换且没有在途请求的后端, 只在事件循环中调用"""
+        for backend in list(self.retired):
+            if backend.outstanding == 0:
+                self.retired.remove(backend)
+                task = asyncio.create_task(self._close(backend))
+                self.closing.add(task)
+                task.add_done_callback(self.closing.discard)
+
+    async def _close(self, backend: Backend) -> None:
+        try:
+            await backend.aclose()
+        except Exception as e:
+            logger.warning(f"关闭 LLM 后端 {backend.name} v{backend.version} 失败: {e!r}")
+            return
+        metrics.inc("llm.client.closed")
+        logger.info(f"LLM 后端 {backend.name} v{backend.version} 连接已关闭")
+
+    async def close(self) -> None:
+        """退出时关闭所有后端的连接池"""
+        backends = self.backends + self.retired
+        self.backends, self.retired = [], []
+        await asyncio.gather(
+            *self.closing, *(self._close(backend) for backend in backends)
+        )
+
+    def _stat(self, name: str, attr: str) -> float:
+        for backend in self.backends:
+            if backend.name == name:
+                return getattr(backend, attr)
+        return 0
+
+    @property
+    def models(self) -> str:
+        """当前使用的模型, 用于区分缓存"""
+        return ",".join(sorted({backend.model for backend in self.backends}))
+
+    def _score(self, backend: Backend) -> float:
+        if self.strategy == "ewma":
+            return (backend.outstanding + 1) * backend.ewma / backend.weight
+        return (backend.outstanding + 1) / backend.weight
+
+    def pick(self, exclude: set[Backend]) -> Optional[Backend]:
+        """选择一个有空闲名额的后端, 优先未被摘除且不在 exclude 中的, 都已占满时返回 None"""
+        now = time.monotonic()
+        # 全部被摘除时仍然尝试, 避免所有请求直接失败
+        healthy = [b for b in self.backends if b.healthy(now)] or self.backends
+        available = [b for b in healthy if b.available()]
+        if not available:
+            return None
+        candidates = [b for b in available if b not in exclude] or available
+        return min(candidates, key=lambda b: (self._score(b), random.random()))
+
+    async def acquire(self, exclude: set[Backend]) -> Backend:
+        """占用一个后端的并发名额, 都已占满时排队等待"""
+        if self.retired:
+            self._reap()
+        if not self.waiters:
+            backend = self.pick(exclude)
+            if backend:
+                backend.outstanding += 1
+                return backend
+        retry_after = math.ceil(self.queue_timeout)
+        if len(self.waiters) >= self.queue_size:
+            metrics.inc("llm.rejected.full")
+            raise LLMOverloaded(429, retry_after, "当前请求人数过多, 请稍后再试")
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, exclude)
+        self.waiters.append(waiter)
+        start = time.monotonic()
+        try:
+            # 分配到名额时 future 的结果即为后端, 名额已由 release 占用
+            return await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            # release 已分配名额, 但本请求超时或被取消 (客户端断开) 没有拿到, 归还名额
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            metrics.inc("llm.rejected.timeout")
+            raise LLMOverloaded(503, retry_after, "服务繁忙, 请稍后再试")
+        finally:
+            metrics.observe("llm.queue.wait", time.monotonic() - start)
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def release(self, backend: Backend) -> None:
+        """归还名额, 按顺序分配给排队中的请求"""
+        backend.outstanding -= 1
+        if self.retired:
+            self._reap()
+        while self.waiters:
+            future, exclude = self.waiters[0]
+            if future.done():
+                self.waiters.popleft()
+                continue
+            backend = self.pick(exclude)
+            if backend is None:
+                return
+            self.waiters.popleft()
+            backend.outstanding += 1
+            future.set_result(backend)
+
+    def _on_success(self, backend: Backend, latency: float) -> None:
+        backend.failures = 0
+        if backend.ewma:
+            backend.ewma += EWMA_ALPHA * (latency - backend.ewma)
+        else:
+            backend.ewma = latency
+
+    def _on_failure(self, backend: Backend, e: Exception) -> None:
+        backend.failures += 1
+        metrics.inc(f"llm.{backend.name}.failures")
+        logger.warning(f"LLM 后端 {backend.name} 调用失败 ({backend.failures}): {e!r}")
+        now = time.monotonic()
+        # 摘除期间在途请求的失败不再延长摘除时间
+        if backend.failures >= self.eject_failures and backend.healthy(now):
+            backend.ejected_until = now + self.eject_seconds
+            metrics.inc(f"llm.{backend.name}.ejected")
+            logger.error(f"LLM 后端 {backend.name} 连续失败, 摘除 {self.eject_seconds} 秒")
+
+    async def invoke(self, prompt: PromptValue) -> AIMessage:
+        exclude: set[Backend] = set()
+        for attempt in range(self.retries + 1):
+            backend = await self.acquire(exclude)
+            start = time.monotonic()
+            try:
+                result = await backend.llm.ainvoke(prompt)
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                self._on_failure(backend, e)
+                if attempt == self.retries:
+                    raise
+                exclude.add(backend)
+                metrics.inc("llm.retries")
+                continue
+            finally:
+                self.release(backend)
+            self._on_success(backend, time.monotonic() - start)
+            return result
+
+    async def stream(self, prompt: PromptValue) -> AsyncIterator[AIMessageChunk]:
+        exclude: set[Backend] = set()
+        for attempt in range(self.retries + 1):
+            backend = await self.acquire(exclude)
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in backend.llm.astream(prompt):
+                    if not started:
+                        started = True
+                        self._on_success(backend, time.monotonic() - start)
+                    yield chunk
+                if not started:
+                    self._on_success(backend, time.monotonic() - start)
+                return
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                self._on_failure(backend, e)
+                # 已经返回过内容的流不能换后端重来
+                if started or attempt == self.retries:
+                    raise
+                exclude.add(backend)
+                metrics.inc("llm.retries")
+            finally:
+                self.release(backend)
@@ -0,0 +1,138 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Generic, Optional, TypeVar
+
+from core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class StreamCancelled(Exception):
+    """上游流因所有订阅者都已断开而取消"""
+
+
+class _Stream(Generic[T]):
+    """一个上游流, 多个订阅者. 后加入的订阅者先补发已收到的内容"""
+
+    def __init__(self, source: AsyncIterator[T], on_cancel: Callable[[], None]):
+        self.chunks: list[T] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        # 取消时调用, 让新请求不再加入这个流
+        self.on_cancel = on_cancel
+        self.task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[T]) -> None:
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            # 内容不完整, 不能当作正常结束
+            self.error = StreamCancelled()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def subscribe(self) -> "_Subscription[T]":
+        return _Subscription(self)
+
+    def leave(self) -> None:
+        self.subscribers -= 1
+        # 所有订阅者都断开时停止上游调用
+        if self.subscribers == 0 and not self.done:
+            self.on_cancel()
+            self.task.cancel()
+
+
+class _Subscription(Generic[T]):
+    """订阅者, 创建时即计入订阅数, 读完或 aclose 时退出. 还未开始读取的订阅者也会阻止上游被取消"""
+
+    def __init__(self, flight: _Stream[T]):
+        self.flight = flight
+        self.index = 0
+        self.closed = False
+        flight.subscribers += 1
+
+    def __aiter__(self) -> "_Subscription[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        flight = self.flight
+        while not self.closed:
+            if self.index < len(flight.chunks):
+                self.index += 1
+                return flight.chunks[self.index - 1]
+            if flight.done:
+                self._leave()
+                if flight.error:
+                    raise flight.error
+                break
+            await flight.changed.wait()
+        raise StopAsyncIteration
+
+    async def aclose(self) -> None:
+        self._leave()
+
+    def _leave(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.flight.leave()
+
+
+class SingleFlight:
+    """合并相同 key 的并发调用, 同一时刻每个 key 只有一次上游调用, 结果分发给所有等待者
+
+    上游调用在独立的任务中执行, 单个请求被取消不会影响其他等待者.
+    """
+
+    def __init__(self):
+        self.calls: dict[str, asyncio.Task] = {}
+        self.streams: dict[str, _Stream] = {}
+
+    async def call(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self.calls[key] = task
+            task.add_done_callback(lambda t: self._forget(self.calls, key, t))
+        else:
+            metrics.inc("singleflight.call.shared")
+        return await asyncio.shield(task)
+
+    def stream(
+        self, key: str, func: Callable[[], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        flight = self.streams.get(key)
+        if flight is None:
+            flight = _Stream(
+                func(), on_cancel=lambda: self._drop(self.streams, key, flight)
+            )
+            self.streams[key] = flight
+            flight.task.add_done_callback(
+                lambda t: self._forget(self.streams, key, flight)
+            )
+        else:
+            metrics.inc("singleflight.stream.shared")
+        return flight.subscribe()
+
+    @staticmethod
+    def _drop(calls: dict, key: str, value) -> None:
+        if calls.get(key) is value:
+            del calls[key]
+
+    @classmethod
+    def _forget(cls, calls: dict, key: str, value) -> None:
+        cls._drop(calls, key, value)
+        task = value.task if isinstance(value, _Stream) else value
+        # 等待者都已取消时异常无人读取, 这里读取一次避免 asyncio 告警
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,45 @@
+import json
+from loguru import logger
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.cache import template_count_cache
+from core.db import async_engine
+from llm.main import removeTemplate, setTemplates, upsertTemplate
+from model import LLMTemplate
+
+# 与 alembic 中 llmtemplate 触发器的通知频道一致
+TEMPLATE_CHANNEL = "llmtemplate"
+
+
+async def load_templates() -> None:
+    """全量加载模板"""
+    async with AsyncSession(async_engine) as session:
+        templates = (await session.exec(select(LLMTemplate))).all()
+        setTemplates(templates)
+    logger.info(f"加载模板完成, 共 {len(templates)} 个")
+
+
+async def reload_template(id: int) -> None:
+    """按 ID 重新加载单个模板"""
+    async with AsyncSession(async_engine) as session:
+        temp = await session.get(LLMTemplate, id)
+    if temp:
+        upsertTemplate(temp)
+    else:
+        removeTemplate(id)
+
+
+async def on_template_change(payload: str) -> None:
+    """处理 llmtemplate 变更通知, 只刷新变更的那一条"""
+    data = json.loads(payload)
+    logger.info(f"收到模板变更通知: {data}")
+    template_count_cache.clear()
+    if data["op"] == "DELETE":
+        removeTemplate(data["id"])
+    else:
+        await reload_template(data["id"])
+
+
+async def on_listener_reconnect() -> None:
+    """启动加载后到开始监听前, 以及断线期间可能丢失通知, 每次开始监听后全量同步一次"""
+    await load_templates()
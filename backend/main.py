@@ -4,11 +4,17 @@ import sys
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
-from sqlmodel import Session, select
-from llm.main import load_config, on_config_change, setTemplates
-from model import LLMTemplate
-from core.db import engine
+from llm.main import load_config, on_config_change, start_llm, stop_llm
+from llm.router import LLMOverloaded
+from llm.template_sync import (
+    TEMPLATE_CHANNEL,
+    load_templates,
+    on_listener_reconnect,
+    on_template_change,
+)
 from core.config import settings
+from core.quota import quota_ledger
+from core.write_queue import write_queue
 from fastapi import FastAPI, Request
 from starlette.middleware.cors import CORSMiddleware
 from api.main import api_router
@@ -17,6 +23,8 @@ import logging
 
 from utils.custom_logging import InterceptHandler, format_record
 from utils.nacos_helper import NacosHelper
+from utils.pg_listener import PgListener
+from utils.wx_client import WxClient
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -37,15 +45,36 @@ beat_interval = settings.NACOS_BEAT_INTERVAL
 nacos = NacosHelper(nacos_endpoint, nacos_namespace_id)
 nacos.set_service(service_name, service_port, nacos_group_name)
 
+# 监听模板变更
+template_listener = PgListener(
+    settings.POSTGRES_DSN,
+    TEMPLATE_CHANNEL,
+    on_template_change,
+    on_reconnect=on_listener_reconnect,
+)
+
 
 # 初始化模板
 @asynccontextmanager
 async def lifespanself(app: FastAPI):
     # 启动前 查询模板
-    with Session(engine) as session:
-        templates = session.exec(select(LLMTemplate)).all()
-        setTemplates(templates)
-    
+    await load_templates()
+    if settings.ENABLE_TEMPLATE_LISTENER:
+        template_listener.start()
+    if settings.QUOTA_LEDGER_ENABLED:
+        quota_ledger.start()
+    write_queue.start()
+    # LLM 后端共用一个 HTTP 连接池
+    start_llm()
+    # 微信接口客户端, 所有登录请求共用连接池
+    app.state.wx_client = WxClient(
+        settings.WX_API_BASE,
+        settings.WX_APP_ID,
+        settings.WX_APP_SECRET,
+        settings.WX_HTTP_TIMEOUT,
+        settings.WX_HTTP_MAX_CONNECTIONS,
+    )
+
     # 启动 Nacos 调度器（同时设置心跳间隔）
     try:
         nacos.start_scheduler(beat_interval)
@@ -59,6 +88,12 @@ async def lifespanself(app: FastAPI):
     yield
     
     # 结束停止的时候
+    await template_listener.stop()
+    await write_queue.stop()
+    if settings.QUOTA_LEDGER_ENABLED:
+        await quota_ledger.stop()
+    await app.state.wx_client.aclose()
+    await stop_llm()
     try:
         nacos.stop_scheduler()  # 这会同时处理注销服务
     except Exception as e:
@@ -102,6 +137,15 @@ def init_app():
 app = init_app()
 
 
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, e: LLMOverloaded):
+    return JSONResponse(
+        status_code=e.status_code,
+        headers={"Retry-After": str(e.retry_after)},
+        content={"code": e.status_code, "message": e.message},
+    )
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, e: Exception):
     logger.error(f"请求路径: {request.url}\n请求方法: {request.method}\n错误信息: {str(e)}")
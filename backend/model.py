@@ -1,21 +1,27 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
-from sqlalchemy import TEXT, Column
+from sqlalchemy import TEXT, Column, Index
 from sqlmodel import Field, SQLModel
 
 
 class SysUser(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
     id: Optional[int] = Field(default=None, primary_key=True)
-    openId: str = Field(default="")
+    openId: str = Field(default="", unique=True, index=True)
     username: str | None = Field(default=None, max_length=255)
     llm_avaiable: Optional[int] = Field(default=3)
+    # llm_avaiable 所属的日期, 早于今天时首次使用会先恢复每日额度
+    quotaDay: Optional[date] = Field(default_factory=date.today)
     lastTime: Optional[datetime] = Field(default_factory=datetime.now)
     createTime: Optional[datetime] = Field(default_factory=datetime.now)
 
 
 class UserAction(SQLModel, table=True):
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # 分享奖励按 (分享者, 类型, 点击者) 判重
+        Index("ix_useraction_userId_type_toUserId", "userId", "type", "toUserId"),
+        {"extend_existing": True},
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     userId: int = Field()
     username: str | None = Field(default=None, max_length=255)
@@ -42,13 +48,31 @@ class UserCreateHistory(SQLModel, table=True):
     createTime: Optional[datetime] = Field(default_factory=datetime.now)
 
 
+# 生成记录按用户倒序分页, 倒序列需要引用列对象, 放在类定义之后
+Index(
+    "ix_usercreatehistory_userId_createTime",
+    UserCreateHistory.userId,
+    UserCreateHistory.createTime.desc(),
+)
+
+
 class LLMTemplate(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
     id: Optional[int] = Field(default=None, primary_key=True)
     type: str
     template: str = (Field(sa_column=Column(TEXT)),)
+    # 生成结果只取决于模板和参数时开启, 相同请求直接返回缓存结果
+    cacheable: bool = Field(default=False)
     createTime: Optional[datetime] = Field(default_factory=datetime.now)
 
 
+# 后台模板列表按 (createTime, id) 倒序游标翻页
+Index(
+    "ix_llmtemplate_createTime_id",
+    LLMTemplate.createTime.desc(),
+    LLMTemplate.id.desc(),
+)
+
+
 class TokenPayload(SQLModel):
     sub: str | None = None
@@ -0,0 +1,54 @@
+"""鉴权依赖的微基准: token 校验缓存 / 用户缓存 命中与未命中
+
+在 backend 目录下运行 (不需要连接数据库):
+    python -m scripts.bench_auth --number 20000
+"""
+
+import argparse
+import time
+
+from api import deps
+from core.cache import token_cache, user_cache
+from core.security import create_access_token
+from model import SysUser
+
+
+def bench(name: str, func, number: int) -> None:
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {elapsed / number * 1e6:.2f} µs/次")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    user = SysUser(id=1, openId="bench", username="bench", llm_avaiable=3)
+    token = create_access_token(f"{user.openId}#{user.id}")
+
+    def decode_cold():
+        token_cache.clear()
+        deps.get_token_user_id(token)
+
+    def decode_cached():
+        deps.get_token_user_id(token)
+
+    # 用户缓存命中时 get_current_user 不访问 session, 也不会挂起, 直接驱动协程
+    user_cache.set(user.id, user)
+
+    def current_user_cached():
+        try:
+            deps.get_current_user(None, token).send(None)
+        except StopIteration:
+            pass
+
+    bench("token 校验 (无缓存)", decode_cold, args.number)
+    bench("token 校验 (缓存命中)", decode_cached, args.number)
+    bench("get_current_user (token 与用户缓存命中)", current_user_cached, args.number)
+
+
+if __name__ == "__main__":
+    main()
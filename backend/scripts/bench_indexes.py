@@ -0,0 +1,142 @@
+"""热点查询索引前后对比: 打印执行计划和平均耗时, 只在本地数据库运行
+
+需要先执行 alembic upgrade head. "无索引" 一组在事务中临时删除索引, 结束后回滚.
+在 backend 目录下运行:
+    python -m scripts.bench_indexes --users 2000 --logs 100 --repeat 50
+"""
+
+import argparse
+import time
+
+from sqlalchemy import func, text
+from sqlmodel import Session, desc, select
+
+from core.db import engine
+from model import SysUser, UserAction, UserCreateHistory
+
+OPEN_ID_PREFIX = "bench-index-"
+INDEXES = (
+    '"ix_sysuser_openId"',
+    '"ix_usercreatehistory_userId_createTime"',
+    '"ix_useraction_userId_type_toUserId"',
+)
+
+
+def seed(users: int, logs: int) -> None:
+    """插入测试用户, 每个用户 logs 条生成记录和分享记录"""
+    with Session(engine) as session:
+        session.exec(
+            text(
+                """
+                INSERT INTO sysuser ("openId", username, llm_avaiable, "lastTime", "createTime")
+                SELECT :prefix || g, 'bench' || g, 3, now(), now()
+                FROM generate_series(1, :users) AS g
+                """
+            ).bindparams(prefix=OPEN_ID_PREFIX, users=users)
+        )
+        session.exec(
+            text(
+                """
+                INSERT INTO usercreatehistory ("userId", username, content, params, "createTime")
+                SELECT u.id, u.username, repeat('作文', 200), '{}', now() - g * interval '1 minute'
+                FROM sysuser u, generate_series(1, :logs) AS g
+                WHERE u."openId" LIKE :prefix
+                """
+            ).bindparams(prefix=f"{OPEN_ID_PREFIX}%", logs=logs)
+        )
+        session.exec(
+            text(
+                """
+                INSERT INTO useraction ("userId", username, type, "toUserId", "createTime")
+                SELECT u.id, u.username, 'share', (u.id + g)::text, now()
+                FROM sysuser u, generate_series(1, :logs) AS g
+                WHERE u."openId" LIKE :prefix
+                """
+            ).bindparams(prefix=f"{OPEN_ID_PREFIX}%", logs=logs)
+        )
+        session.commit()
+
+
+def cleanup() -> None:
+    with Session(engine) as session:
+        for table in ("usercreatehistory", "useraction"):
+            session.exec(
+                text(
+                    f"""
+                    DELETE FROM {table} WHERE "userId" IN (
+                        SELECT id FROM sysuser WHERE "openId" LIKE :prefix
+                    )
+                    """
+                ).bindparams(prefix=f"{OPEN_ID_PREFIX}%")
+            )
+        session.exec(
+            text('DELETE FROM sysuser WHERE "openId" LIKE :prefix').bindparams(
+                prefix=f"{OPEN_ID_PREFIX}%"
+            )
+        )
+        session.commit()
+
+
+def queries(session: Session) -> dict[str, object]:
+    """与接口中一致的三条查询, 取中间位置的测试用户"""
+    user = session.exec(
+        select(SysUser)
+        .where(SysUser.openId.startswith(OPEN_ID_PREFIX))
+        .order_by(SysUser.id)
+        .offset(100)
+    ).first()
+    return {
+        "wxLogin 按 openId 查用户": select(SysUser).where(SysUser.openId == user.openId),
+        "生成记录 最近20条": select(UserCreateHistory)
+        .where(UserCreateHistory.userId == user.id)
+        .order_by(desc(UserCreateHistory.createTime))
+        .limit(20),
+        "分享判重": select(func.count(UserAction.id)).where(
+            UserAction.userId == user.id,
+            UserAction.type == "share",
+            UserAction.toUserId == str(user.id + 1),
+        ),
+    }
+
+
+def run(session: Session, repeat: int) -> None:
+    for name, statement in queries(session).items():
+        sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+        plan = session.exec(text(f"EXPLAIN ANALYZE {sql}")).all()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            session.exec(text(sql)).all()
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"  {name}: {elapsed * 1000:.3f} ms/次")
+        for (line,) in plan:
+            print(f"    {line}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--logs", type=int, default=100, help="每个用户的生成记录/分享记录数")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    cleanup()
+    seed(args.users, args.logs)
+    try:
+        with Session(engine) as session:
+            session.exec(text("ANALYZE sysuser, usercreatehistory, useraction"))
+            session.commit()
+
+            print("无索引:")
+            for index in INDEXES:
+                session.exec(text(f"DROP INDEX {index}"))
+            run(session, args.repeat)
+            session.rollback()
+
+            print("有索引:")
+            run(session, args.repeat)
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
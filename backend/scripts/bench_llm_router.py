@@ -0,0 +1,90 @@
+"""LLM 多后端路由压测, 配合 scripts/llm_stub_server.py 使用, 不需要数据库
+
+在 backend 目录下先启动若干模拟后端 (见 llm_stub_server.py), 再运行:
+    python -m scripts.bench_llm_router --backends http://127.0.0.1:8101/v1/ http://127.0.0.1:8102/v1/ \
+        --total 500 --concurrency 50 --routing ewma
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from langchain_core.prompt_values import StringPromptValue
+
+from llm.main import create_http_client
+from llm.router import Backend, LLMRouter
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", required=True)
+    parser.add_argument("--total", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--routing", default="least_outstanding")
+    parser.add_argument("--stream", action="store_true", help="使用流式接口")
+    parser.add_argument(
+        "--shared-client", action="store_true", help="所有后端共用一个 HTTP 连接池"
+    )
+    args = parser.parse_args()
+
+    http_client = create_http_client() if args.shared_client else None
+    router = LLMRouter(args.routing)
+    router.set_backends(
+        [
+            Backend(f"b{i}", url, "stub", "stub", http_client=http_client)
+            for i, url in enumerate(args.backends)
+        ]
+    )
+    prompt = StringPromptValue(text="写一篇作文")
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def call() -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if args.stream:
+                    async for _ in router.stream(prompt):
+                        pass
+                else:
+                    await router.invoke(prompt)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async def requests(url: str) -> int:
+        """模拟后端收到的请求数, 包含失败的请求"""
+        async with httpx.AsyncClient() as client:
+            base = url.removesuffix("/").removesuffix("/v1")
+            response = await client.get(f"{base}/stats")
+            return response.json()["requests"]
+
+    before = {b.name: await requests(b.base_url) for b in router.backends}
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(args.total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{args.total} 次调用, 并发 {args.concurrency}, 策略 {args.routing}, 失败 {errors}, "
+        f"{args.total / elapsed:.1f} 次/秒, p50 {p50:.1f}ms, p99 {p99:.1f}ms"
+    )
+    for backend in router.backends:
+        served = await requests(backend.base_url) - before[backend.name]
+        print(
+            f"  {backend.name} {backend.base_url}: 收到 {served} 次, "
+            f"EWMA {backend.ewma * 1000:.1f}ms, 连续失败 {backend.failures}, "
+            f"摘除中 {backend.ejected_until > time.monotonic()}"
+        )
+    await router.close()
+    if http_client is not None:
+        await http_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""对比生成接口扣减额度时的数据库往返次数 (直接 UPDATE vs 额度账本)
+
+在 backend 目录下运行, 需要能连接 .env 中配置的数据库:
+    python -m scripts.bench_quota --users 50 --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlmodel import Session, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.routes.wechat_miniprogram import deps
+from core.config import settings
+from core.db import async_engine, engine
+from core.quota import quota_ledger
+from core.security import create_access_token
+from model import SysUser
+
+OPEN_ID_PREFIX = "bench-quota-"
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def seed_users(num: int, quota: int) -> list[str]:
+    with Session(engine) as session:
+        users = [
+            SysUser(openId=f"{OPEN_ID_PREFIX}{i}", username=f"bench{i}", llm_avaiable=quota)
+            for i in range(num)
+        ]
+        session.add_all(users)
+        session.commit()
+        return [create_access_token(f"{user.openId}#{user.id}") for user in users]
+
+
+def cleanup() -> None:
+    with Session(engine) as session:
+        session.exec(delete(SysUser).where(SysUser.openId.startswith(OPEN_ID_PREFIX)))
+        session.commit()
+
+
+async def run(tokens: list[str], requests: int, use_ledger: bool) -> tuple[int, float]:
+    settings.QUOTA_LEDGER_ENABLED = use_ledger
+    counter = RoundTripCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+    start = time.perf_counter()
+    last_flush = start
+    try:
+        for i in range(requests):
+            # 与 get_db 一致
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                try:
+                    await deps.get_current_llm_user(session, tokens[i % len(tokens)])
+                except HTTPException:
+                    pass
+            # 模拟后台按间隔写回
+            now = time.perf_counter()
+            if use_ledger and now - last_flush >= quota_ledger.flush_interval:
+                await quota_ledger.flush()
+                last_flush = now
+        if use_ledger:
+            await quota_ledger.flush(clear=True)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+        await async_engine.dispose()
+    return counter.count, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    quota = args.requests
+
+    for use_ledger in (False, True):
+        cleanup()
+        tokens = seed_users(args.users, quota)
+        try:
+            count, elapsed = asyncio.run(run(tokens, args.requests, use_ledger))
+        finally:
+            cleanup()
+        name = "额度账本" if use_ledger else "直接UPDATE"
+        print(
+            f"{name}: {args.requests} 次扣减, 数据库往返 {count} 次 "
+            f"({count / args.requests:.2f}/次), 耗时 {elapsed:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
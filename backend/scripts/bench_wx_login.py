@@ -0,0 +1,58 @@
+"""微信登录吞吐压测, 配合 scripts/wx_stub_server.py 使用
+
+在 backend 目录下运行:
+    python -m scripts.bench_wx_login --url http://127.0.0.1:3332 --total 2000 --concurrency 100
+code 取值范围决定新老用户比例, --users 越小越多是已存在用户
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from core.config import settings
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=f"http://127.0.0.1:{settings.SEVER_PORT}")
+    parser.add_argument("--total", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+
+        async def login() -> None:
+            nonlocal errors
+            async with semaphore:
+                code = f"bench-{random.randrange(args.users)}"
+                start = time.perf_counter()
+                response = await client.post(
+                    f"{settings.API_V1_STR}/wx/login", json={"code": code}
+                )
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{args.total} 次登录, 并发 {args.concurrency}, 失败 {errors}, "
+        f"{args.total / elapsed:.1f} 次/秒, p50 {p50:.1f}ms, p99 {p99:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""本地模拟 OpenAI 兼容的 chat/completions 接口, 用于测试多后端路由和限流
+
+在 backend 目录下运行, 每个端口一个模拟后端:
+    LLM_STUB_DELAY=0.02 uvicorn scripts.llm_stub_server:app --port 8101
+    LLM_STUB_DELAY=0.2 LLM_STUB_FAIL_RATE=0.3 uvicorn scripts.llm_stub_server:app --port 8102
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+
+# 每个 token 的耗时(秒)
+DELAY = float(os.environ.get("LLM_STUB_DELAY", "0.02"))
+# 返回 500 的比例
+FAIL_RATE = float(os.environ.get("LLM_STUB_FAIL_RATE", "0"))
+TOKENS = ["这是", "一篇", "模拟", "的", "作文", "。"] * int(
+    os.environ.get("LLM_STUB_REPEAT", "5")
+)
+
+# 收到的请求数, 压测脚本据此统计每个后端的分配情况
+stats = {"requests": 0}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def chunk(model: str, delta: dict, finish_reason=None) -> str:
+    data = {
+        "id": "stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body["model"]
+    stats["requests"] += 1
+    if random.random() < FAIL_RATE:
+        return JSONResponse({"error": {"message": "stub failure"}}, status_code=500)
+    usage = {
+        "prompt_tokens": 10,
+        "completion_tokens": len(TOKENS),
+        "total_tokens": 10 + len(TOKENS),
+    }
+
+    if body.get("stream"):
+
+        async def generate():
+            for token in TOKENS:
+                await asyncio.sleep(DELAY)
+                yield chunk(model, {"content": token})
+            yield chunk(model, {}, "stop")
+            if body.get("stream_options", {}).get("include_usage"):
+                data = {
+                    "id": "stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(data)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    await asyncio.sleep(DELAY * len(TOKENS))
+    return {
+        "id": "stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(TOKENS)},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage,
+    }
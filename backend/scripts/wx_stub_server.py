@@ -0,0 +1,21 @@
+"""本地模拟微信 jscode2session 接口, 用于登录压测
+
+在 backend 目录下运行, 并以 WX_API_BASE=http://127.0.0.1:8098 启动后端:
+    WX_STUB_DELAY=0.05 uvicorn scripts.wx_stub_server:app --port 8098
+"""
+
+import asyncio
+import os
+
+from fastapi import FastAPI
+
+app = FastAPI()
+
+# 模拟微信接口耗时(秒)
+DELAY = float(os.environ.get("WX_STUB_DELAY", "0.05"))
+
+
+@app.get("/sns/jscode2session")
+async def jscode2session(js_code: str):
+    await asyncio.sleep(DELAY)
+    return {"openid": f"stub-{js_code}", "session_key": "stub"}
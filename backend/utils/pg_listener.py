@@ -0,0 +1,66 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+import psycopg
+from loguru import logger
+
+
+class PgListener:
+    """Postgres LISTEN/NOTIFY 监听, 断线自动重连"""
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str,
+        callback: Callable[[str], Awaitable[None]],
+        on_reconnect: Optional[Callable[[], Awaitable[None]]] = None,
+        retry_interval: int = 5,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.callback = callback
+        # 每次 LISTEN 成功后回调 (包括首次), 用于补偿未监听期间丢失的通知
+        self.on_reconnect = on_reconnect
+        self.retry_interval = retry_interval
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """启动监听任务"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+            logger.info(f"开始监听 Postgres 通知: {self.channel}")
+
+    async def stop(self) -> None:
+        """停止监听任务"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        logger.info(f"停止监听 Postgres 通知: {self.channel}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.dsn, autocommit=True
+                ) as conn:
+                    await conn.execute(f'LISTEN "{self.channel}"')
+                    # 启动时的全量加载与首次 LISTEN 之间的通知同样会丢失, 首次也要补偿
+                    if self.on_reconnect:
+                        await self.on_reconnect()
+                    async for notify in conn.notifies():
+                        try:
+                            await self.callback(notify.payload)
+                        except Exception as e:
+                            logger.error(f"处理 Postgres 通知失败 {notify.payload}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"Postgres 通知连接断开: {e}, {self.retry_interval}秒后重连"
+                )
+            await asyncio.sleep(self.retry_interval)
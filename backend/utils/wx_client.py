@@ -0,0 +1,42 @@
+import httpx
+
+
+class WxClient:
+    """微信服务端接口客户端, 复用 keep-alive 连接, 连接数上限即并发上限"""
+
+    def __init__(
+        self,
+        base_url: str,
+        app_id: str,
+        app_secret: str,
+        timeout: float,
+        max_connections: int,
+    ):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            # 连接池满时最多等待 timeout 秒
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def code2session(self, code: str) -> dict:
+        """小程序登录凭证校验, 非 2xx 抛出 httpx.HTTPStatusError, 响应不是 JSON 抛出 ValueError"""
+        response = await self.client.get(
+            "/sns/jscode2session",
+            params={
+                "appid": self.app_id,
+                "secret": self.app_secret,
+                "js_code": code,
+                "grant_type": "authorization_code",
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -14,6 +14,22 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
+    # 连接池
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_PRE_PING: bool = True
+    # 连接最长存活秒数, -1 表示不回收
+    DB_POOL_RECYCLE: int = 1800
+    # 通过 PgBouncer (事务模式) 连接时开启, 禁用预编译语句
+    DB_PGBOUNCER_MODE: bool = False
+
+    # 后端已在跨天首次使用时恢复额度, 关闭后不再执行零点全表重置
+    ENABLE_DAILY_RESET: bool = True
+    # 每日重置的可用次数
+    DAILY_LLM_CHANCES: int = 3
+    # 重置时每批更新的 id 范围, 0 表示一条 UPDATE 全表更新
+    RESET_BATCH_SIZE: int = 0
 
     @computed_field
     @property
@@ -1,4 +1,20 @@
 from sqlmodel import create_engine
 from config.config import settings
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+
+def engine_options() -> dict:
+    """连接池配置"""
+    options = dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if settings.DB_PGBOUNCER_MODE:
+        # PgBouncer 事务模式下不能使用服务端预编译语句
+        options["connect_args"] = {"prepare_threshold": None}
+    return options
+
+
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), **engine_options())
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 from sqlmodel import Field, SQLModel
 
@@ -7,8 +7,9 @@ class SysUser(SQLModel, table=True):
     __table_args__ = {"extend_existing": True}
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    openId: str = Field(default="", description="微信openId")
+    openId: str = Field(default="", unique=True, index=True, description="微信openId")
     username: Optional[str] = Field(default=None, max_length=255, description="用户名")
     llm_avaiable: int = Field(default=3, description="剩余使用次数")
+    quotaDay: Optional[date] = Field(default_factory=date.today, description="额度所属日期")
     lastTime: datetime = Field(default_factory=datetime.now, description="最后使用时间")
     createTime: datetime = Field(default_factory=datetime.now, description="创建时间") 
\ No newline at end of file
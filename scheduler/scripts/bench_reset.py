@@ -0,0 +1,96 @@
+"""每日额度重置基准测试, 只在本地数据库运行 (会重置整张 sysuser 表的额度)
+
+在 scheduler 目录下运行:
+    python -m scripts.bench_reset --rows 2000000 --batch-size 50000
+"""
+
+import argparse
+import time
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from config.db import engine
+from models.user import SysUser
+from tasks.user_tasks import reset_user_daily_chances
+
+OPEN_ID_PREFIX = "bench-reset-"
+
+
+def seed(rows: int) -> None:
+    """插入测试用户, 其中一半额度低于每日额度"""
+    with Session(engine) as session:
+        session.exec(
+            text(
+                """
+                INSERT INTO sysuser ("openId", username, llm_avaiable, "lastTime", "createTime")
+                SELECT :prefix || g, 'bench' || g, g % 6, now(), now()
+                FROM generate_series(1, :rows) AS g
+                """
+            ).bindparams(prefix=OPEN_ID_PREFIX, rows=rows)
+        )
+        session.commit()
+
+
+def consume() -> None:
+    """把测试用户的额度恢复到低于每日额度的状态"""
+    with Session(engine) as session:
+        session.exec(
+            text(
+                "UPDATE sysuser SET llm_avaiable = id % 6 WHERE \"openId\" LIKE :prefix"
+            ).bindparams(prefix=f"{OPEN_ID_PREFIX}%")
+        )
+        session.commit()
+
+
+def cleanup() -> None:
+    with Session(engine) as session:
+        session.exec(
+            text('DELETE FROM sysuser WHERE "openId" LIKE :prefix').bindparams(
+                prefix=f"{OPEN_ID_PREFIX}%"
+            )
+        )
+        session.commit()
+
+
+def reset_with_orm() -> int:
+    """原实现: 加载所有用户后逐行更新"""
+    with Session(engine) as session:
+        users = session.exec(select(SysUser).where(SysUser.llm_avaiable < 3)).all()
+        for user in users:
+            user.llm_avaiable = 3
+        session.add_all(users)
+        session.commit()
+        return len(users)
+
+
+def timed(name: str, func) -> None:
+    consume()
+    start = time.perf_counter()
+    count = func()
+    print(f"{name}: 重置 {count} 行, 耗时 {time.perf_counter() - start:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--skip-orm", action="store_true", help="跳过逐行更新的原实现")
+    args = parser.parse_args()
+
+    cleanup()
+    seed(args.rows)
+    try:
+        if not args.skip_orm:
+            timed("逐行 ORM 更新", reset_with_orm)
+        timed("单条 UPDATE", lambda: reset_user_daily_chances(batch_size=0))
+        timed(
+            f"分批 UPDATE({args.batch_size})",
+            lambda: reset_user_daily_chances(batch_size=args.batch_size),
+        )
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,59 @@
-from sqlmodel import Session, select
+from typing import Optional
+from sqlmodel import Session, func, select, update
 from loguru import logger
 from models.user import SysUser
+from config.config import settings
 from config.db import engine
 
-def reset_user_daily_chances() -> None:
-    """重置用户每日使用次数"""
-    logger.info("开始重置用户每日使用次数")
-    try:
+
+def _reset_statement(daily_chances: int):
+    return (
+        update(SysUser)
+        .where(SysUser.llm_avaiable < daily_chances)
+        .values(llm_avaiable=daily_chances)
+    )
+
+
+def _reset_all(daily_chances: int) -> int:
+    """一条 UPDATE 重置全表"""
+    with Session(engine) as session:
+        result = session.exec(_reset_statement(daily_chances))
+        session.commit()
+        return result.rowcount
+
+
+def _reset_in_batches(daily_chances: int, batch_size: int) -> int:
+    """按 id 范围分批重置, 每批单独提交, 避免长事务"""
+    with Session(engine) as session:
+        max_id = session.exec(select(func.max(SysUser.id))).one() or 0
+
+    total = 0
+    last_id = 0
+    while last_id < max_id:
         with Session(engine) as session:
-            statement = select(SysUser).where(SysUser.llm_avaiable < 3)
-            users = session.exec(statement).all()
-            
-            for user in users:
-                user.llm_avaiable = 3
-                
-            session.add_all(users)
+            result = session.exec(
+                _reset_statement(daily_chances).where(
+                    SysUser.id > last_id, SysUser.id <= last_id + batch_size
+                )
+            )
             session.commit()
-            
-        logger.info(f"重置完成,共重置 {len(users)} 个用户")
+            total += result.rowcount
+        last_id += batch_size
+    return total
+
+
+def reset_user_daily_chances(batch_size: Optional[int] = None) -> int:
+    """重置用户每日使用次数, 返回重置的用户数"""
+    logger.info("开始重置用户每日使用次数")
+    daily_chances = settings.DAILY_LLM_CHANCES
+    batch_size = settings.RESET_BATCH_SIZE if batch_size is None else batch_size
+    try:
+        if batch_size > 0:
+            count = _reset_in_batches(daily_chances, batch_size)
+        else:
+            count = _reset_all(daily_chances)
+        logger.info(f"重置完成,共重置 {count} 个用户, 连接池: {engine.pool.status()}")
+        return count
     except Exception as e:
         logger.error(f"重置用户使用次数失败: {e}")
-        raise 
\ No newline at end of file
+        raise
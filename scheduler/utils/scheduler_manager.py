@@ -2,9 +2,12 @@ from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
-from apscheduler.jobstores.base import ConflictingIdError
+from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
+from apscheduler.events import EVENT_SCHEDULER_STARTED
+from apscheduler.schedulers.base import STATE_STOPPED
 from loguru import logger
 from config.config import settings
+from config.db import engine
 from tasks.user_tasks import reset_user_daily_chances
 
 class SchedulerManager:
@@ -16,8 +19,9 @@ class SchedulerManager:
         """创建并配置调度器"""
         jobstores = {
             "default": MemoryJobStore(),
+            # 与任务共用同一个连接池
             "persistent": SQLAlchemyJobStore(
-                url=str(settings.SQLALCHEMY_DATABASE_URI), 
+                engine=engine,
                 tablename="scheduler_jobs"
             )
         }
@@ -42,13 +46,16 @@ class SchedulerManager:
     def _init_jobs(self) -> None:
         """初始化所有定时任务"""
         # 每天0点重置用户机会
-        self.add_daily_job(
-            "reset_daily_chances",
-            reset_user_daily_chances,
-            "0 0 * * *",  # 分 时 日 月 周
-            jobstore="persistent",  # 使用持久化存储
-            replace_existing=True   # 如果任务已存在则替换
-        )
+        if settings.ENABLE_DAILY_RESET:
+            self.add_daily_job(
+                "reset_daily_chances",
+                reset_user_daily_chances,
+                "0 0 * * *",  # 分 时 日 月 周
+                jobstore="persistent",  # 使用持久化存储
+                replace_existing=True   # 如果任务已存在则替换
+            )
+        else:
+            self.remove_job("reset_daily_chances", jobstore="persistent")
         
         # 这里可以添加更多定时任务...
 
@@ -113,6 +120,28 @@ class SchedulerManager:
         except Exception as e:
             logger.error(f"添加定时任务失败 {job_id}: {e}")
 
+    def remove_job(self, job_id: str, jobstore: str = "default") -> None:
+        """移除定时任务, 持久化存储中的任务也会被删除
+
+        调度器启动前只能找到尚未提交的任务 (持久化的表也可能还不存在),
+        此时改为在启动完成, 开始执行任务之前删除
+        """
+        if self.scheduler.state == STATE_STOPPED:
+
+            def on_started(event) -> None:
+                self.scheduler.remove_listener(on_started)
+                self.remove_job(job_id, jobstore)
+
+            self.scheduler.add_listener(on_started, EVENT_SCHEDULER_STARTED)
+            return
+        try:
+            self.scheduler.remove_job(job_id, jobstore)
+            logger.info(f"移除定时任务: {job_id}")
+        except JobLookupError:
+            pass
+        except Exception as e:
+            logger.error(f"移除定时任务失败 {job_id}: {e}")
+
     def start(self) -> None:
         """启动调度器"""
         try: